@@ -11,50 +11,84 @@ Genera datos sintéticos y consistentes para TODAS las tablas:
 
 Características:
 - Lee credenciales desde .env (en la raíz del repo)
-- Siempre limpia (TRUNCATE … RESTART IDENTITY CASCADE) antes de insertar
+- Siempre limpia (TRUNCATE … RESTART IDENTITY CASCADE o data/raw) antes de insertar
 - Semilla fija para reproducibilidad
+- Trips generados por lotes con NumPy (motor vectorizado, sin bucle por fila)
 - Horarios 06–22 con picos 08–10 y 14–16
 - Consumo de combustible por tipo de vehículo
 - Pesos de paquetes con distribución lognormal truncada
 - Mantenimiento cada ~10.000 km (con leve ruido)
-- Validaciones básicas y resumen final
+- Carga con execute_batch o COPY … FROM STDIN (--loader)
+- Modo paralelo por shards con semillas determinísticas (--workers)
+- Grafo en memoria entre etapas: ids asignados en cliente, la DB solo se escribe
+- Pool de identidades Faker precalculado y cacheado en data/interim (--identity-pool)
+- Salida sin DB a data/raw en Parquet o CSV gzip particionado por mes (--output)
+- Modo continuo (--append): inserta trips/entregas a una tasa objetivo con el
+  perfil horario, completa trips y llena delivered_datetime en tiempo simulado
+- Validación de calidad en un solo pase por tabla (checks fusionados, scans en
+  paralelo) o en memoria antes de escribir (--validate db|memory|off)
+- Carga masiva con índices, UNIQUE y FKs diferidos y reconstruidos en paralelo
+  al final, con ANALYZE (--defer-indexes)
+- Resumen final con métricas por etapa
+  (wall, CPU, filas/s, RSS pico del proceso, bytes escritos)
 
 Ejecutar (desde la raíz):
     python Scripts\01_data_generation.py
+    python Scripts\01_data_generation.py --scale-factor 10 --loader copy --workers 8
+    python Scripts\01_data_generation.py --stages trips,deliveries --batch-size 50000
+    python Scripts\01_data_generation.py --scale-factor 10 --loader copy --defer-indexes
+    python Scripts\01_data_generation.py --append --rate 20 --time-scale 120
 """
 
+import argparse
+import io
 import os
 import json
 import logging
+import multiprocessing
 import random
+import shutil
 import string
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import numpy as np
 import psycopg2
 from dotenv import load_dotenv
 from faker import Faker
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_batch, execute_values
+
+try:  # RSS pico (Unix); en Windows se omite
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
 
 # --------------------------------------------------------------------------------------
 # Logging
 # --------------------------------------------------------------------------------------
-os.makedirs("logs", exist_ok=True)
-STAMP = datetime.now().strftime("%Y%m%d_%H%M")
-LOG_PATH = f"logs/data_load_{STAMP}.log"
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    handlers=[logging.FileHandler(LOG_PATH, encoding="utf-8"), logging.StreamHandler()],
-)
+def setup_logging():
+    """Log a consola y a logs/data_load_<fecha>.log (solo al ejecutar el script)"""
+    os.makedirs("logs", exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        handlers=[
+            logging.FileHandler(f"logs/data_load_{stamp}.log", encoding="utf-8"),
+            logging.StreamHandler(),
+        ],
+    )
+
 
 # --------------------------------------------------------------------------------------
 # Semillas (reproducibilidad)
 # --------------------------------------------------------------------------------------
 SEED = 42
 random.seed(SEED)
-np.random.seed(SEED)
 Faker.seed(SEED)
 fake = Faker("es_CO")
 
@@ -106,13 +140,344 @@ MAINTENANCE_TYPES = [
     ("Alineación y balanceo", 180000, 30),
 ]
 
+# Modos de carga: execute_batch (INSERT por páginas) o COPY … FROM STDIN
+LOADER_MODES = ("batch", "copy")
+COPY_CHUNK_ROWS = 100_000  # filas por COPY/commit si no se indica granularidad
+BATCH_COMMIT_ROWS = 2000  # filas por commit de trips/deliveries con execute_batch
+
+TABLES = ("vehicles", "drivers", "routes", "trips", "deliveries", "maintenance")
+
+# Volúmenes base (scale factor 1); --scale-factor los escala en bloque
+BASE_COUNTS = {
+    "vehicles": 200,
+    "drivers": 400,
+    "routes": 50,
+    "trips": 100_000,
+    "deliveries": 400_000,
+    "maintenance": 5_000,
+}
+MAX_ROUTES = 220  # simples (20x2) + compuestas A-B-C (60) + A-B-C-D (120)
+
+# Columnas de trips que quedan en el grafo (las usa el fan-out de entregas)
+TRIP_GRAPH_COLUMNS = (
+    "departure_datetime",
+    "arrival_datetime",
+    "completed",
+    "total_weight_kg",
+    "destination_city",
+)
+
+TRIP_COLUMNS = (
+    "vehicle_id",
+    "driver_id",
+    "route_id",
+    "departure_datetime",
+    "arrival_datetime",
+    "fuel_consumed_liters",
+    "total_weight_kg",
+    "status",
+)
+DELIVERY_COLUMNS = (
+    "trip_id",
+    "tracking_number",
+    "customer_name",
+    "delivery_address",
+    "package_weight_kg",
+    "scheduled_datetime",
+    "delivered_datetime",
+    "delivery_status",
+    "recipient_signature",
+)
+
+IDENTITY_POOL_DIR = os.path.join("data", "interim", "identity_pools")
+
+# Destinos de salida: PostgreSQL o archivos particionados en data/raw
+OUTPUT_MODES = ("postgres", "parquet", "csv")
+RAW_DIR = os.path.join("data", "raw")
+
+# Validación de calidad: en la DB (scans compartidos), en memoria durante la
+# generación (antes de escribir) o desactivada
+VALIDATION_MODES = ("db", "memory", "off")
+# Un scan por tabla base; los checks del mismo scan se fusionan en una sola
+# consulta con COUNT(*) FILTER (WHERE …)
+QUALITY_SCANS = {
+    "trips": """trips t
+        LEFT JOIN vehicles v ON v.vehicle_id = t.vehicle_id
+        LEFT JOIN drivers dr ON dr.driver_id = t.driver_id""",
+    "deliveries": """deliveries d
+        LEFT JOIN trips t ON t.trip_id = d.trip_id""",
+}
+# check -> (scan, clave de muestra, predicado de violación)
+QUALITY_CHECKS = {
+    "Trips sin vehículo válido": ("trips", "t.trip_id", "v.vehicle_id IS NULL"),
+    "Deliveries sin trip válido": ("deliveries", "d.delivery_id", "t.trip_id IS NULL"),
+    "arrival <= departure": (
+        "trips",
+        "t.trip_id",
+        "t.arrival_datetime IS NOT NULL AND t.arrival_datetime <= t.departure_datetime",
+    ),
+    "Peso excede capacidad": (
+        "trips",
+        "t.trip_id",
+        "t.total_weight_kg > v.capacity_kg",
+    ),
+    "Licencia vencida vs fecha viaje": (
+        "trips",
+        "t.trip_id",
+        "dr.license_expiry IS NOT NULL AND t.departure_datetime::date > dr.license_expiry",
+    ),
+    "Entregas sin tracking": (
+        "deliveries",
+        "d.delivery_id",
+        "d.tracking_number IS NULL OR d.tracking_number = ''",
+    ),
+}
+QUALITY_SAMPLE_SIZE = 5
+
+# Carga masiva con índices/FKs diferidos: DDL de reconstrucción guardado antes
+# de borrarlos (si el proceso cae, la próxima ejecución los recupera de aquí)
+DEFERRED_DDL_PATH = os.path.join("data", "interim", "deferred_ddl.json")
+REBUILD_MAINTENANCE_WORK_MEM = os.getenv("GEN_MAINTENANCE_WORK_MEM", "512MB")
+
+
+# --------------------------------------------------------------------------------------
+# Pool de identidades (Faker precalculado y cacheado)
+# --------------------------------------------------------------------------------------
+class IdentityPool:
+    """
+    Pool reproducible de identidades generado UNA vez con Faker:
+    - first_names / last_names: N pares (nombre, apellido) únicos
+    - streets: N direcciones únicas por ciudad (matriz ciudades x N)
+    - technicians: plantilla fija de técnicos de mantenimiento
+    Se guarda como arrays .npy de bytes UTF-8 (ancho fijo, compactos) y se abre
+    con memory-map; las entregas solo muestrean índices. N controla la
+    cardinalidad de clientes (dim_customer).
+    """
+
+    def __init__(self, first_names, last_names, streets, technicians, cities):
+        self.first_names = first_names
+        self.last_names = last_names
+        self.streets = streets
+        self.technicians = technicians
+        self.cities = list(cities)
+        self.city_index = {c: i for i, c in enumerate(self.cities)}
+
+    @property
+    def size(self) -> int:
+        return len(self.first_names)
+
+    @staticmethod
+    def decode(values: np.ndarray) -> list:
+        """Array de bytes UTF-8 -> lista de str."""
+        return [v.decode("utf-8") for v in values.tolist()]
+
+    def full_names(self, idx: np.ndarray) -> list:
+        """'Nombre Apellido' para un array de índices del pool."""
+        return [
+            f"{f} {la}"
+            for f, la in zip(
+                self.decode(self.first_names[idx]), self.decode(self.last_names[idx])
+            )
+        ]
+
+    @staticmethod
+    def _unique(draw, n: int, what: str) -> list:
+        seen, out = set(), []
+        for _ in range(n * 20):
+            v = draw()
+            if v not in seen:
+                seen.add(v)
+                out.append(v)
+                if len(out) == n:
+                    return out
+        raise ValueError(f"Faker no produce {n} {what} únicos; reduzca el pool.")
+
+    @classmethod
+    def build(cls, size: int, seed: int = SEED, cities=CITIES, n_technicians=200):
+        """Genera el pool con una instancia Faker propia (no toca la global)."""
+        f = Faker("es_CO")
+        f.seed_instance(seed)
+        pairs = cls._unique(lambda: (f.first_name(), f.last_name()), size, "nombres")
+        streets = [cls._unique(f.street_address, size, "direcciones") for _ in cities]
+        techs = cls._unique(
+            lambda: f"{f.first_name()} {f.last_name()}", n_technicians, "técnicos"
+        )
+        return cls(
+            np.char.encode([p[0] for p in pairs], "utf-8"),
+            np.char.encode([p[1] for p in pairs], "utf-8"),
+            np.char.encode(streets, "utf-8"),
+            np.char.encode(techs, "utf-8"),
+            cities,
+        )
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            for name in ("first_names", "last_names", "streets", "technicians"):
+                np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(tmp, "cities.json"), "w", encoding="utf-8") as f:
+                json.dump(self.cities, f, ensure_ascii=False)
+            os.replace(tmp, path)  # publicación atómica del cache
+        finally:
+            # si otro proceso publicó antes, os.replace falla: no dejar el tmp
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def open(cls, path: str):
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("first_names", "last_names", "streets", "technicians")
+        }
+        with open(os.path.join(path, "cities.json"), encoding="utf-8") as f:
+            cities = json.load(f)
+        return cls(cities=cities, **arrays)
+
+    @classmethod
+    def load_or_build(
+        cls, size: int, seed: int = SEED, cities=CITIES, cache_dir=IDENTITY_POOL_DIR
+    ):
+        """Abre el pool cacheado (memory-map) o lo genera y lo guarda."""
+        path = os.path.join(cache_dir, f"pool_s{seed}_n{size}")
+        if os.path.isdir(path):
+            pool = cls.open(path)
+            if pool.cities == list(cities):
+                return pool
+            shutil.rmtree(path)
+        logging.info(f"🧬 Generando pool de identidades (n={size:,})…")
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            cls.build(size, seed, cities).save(path)
+        except OSError:
+            if not os.path.isdir(path):  # otro proceso pudo publicarlo antes
+                raise
+        logging.info(f"✔ Pool de identidades en {path}")
+        return cls.open(path)
+
+
+# --------------------------------------------------------------------------------------
+# Salida a archivos (sin base de datos)
+# --------------------------------------------------------------------------------------
+class FileSink:
+    """
+    Escribe cada tabla como archivos en 'output_dir/<tabla>/':
+    - parquet (snappy) o csv (gzip), vía pyarrow
+    - particionado estilo Hive 'month=YYYY-MM/' cuando se indica la partición
+    - particiones codificadas en paralelo con un pool de hilos
+    'part_prefix' evita choques de nombres entre procesos (shards).
+    """
+
+    def __init__(self, output_dir: str, fmt: str = "parquet", part_prefix: str = ""):
+        if fmt not in ("parquet", "csv"):
+            raise ValueError(f"Formato de archivo no soportado: {fmt!r}")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.part_prefix = part_prefix
+        self._seq = {}  # tabla -> nº de part siguiente
+
+    def start_parts(self, prefix: str):
+        """Nuevo prefijo de parts (p. ej. un shard) con la numeración desde 0."""
+        self.part_prefix = prefix
+        self._seq = {}
+
+    def clear(self, tables):
+        for table in tables:
+            shutil.rmtree(os.path.join(self.output_dir, table), ignore_errors=True)
+
+    def _write_file(self, table, path: str) -> int:
+        import pyarrow.csv as pcsv
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.fmt == "parquet":
+            pq.write_table(table, path, compression="snappy")
+        else:
+            import pyarrow as pa
+
+            with pa.CompressedOutputStream(path, "gzip") as out:
+                pcsv.write_csv(table, out)
+        return os.path.getsize(path)
+
+    def write(self, table: str, columns: tuple, rows: list, partition=None) -> int:
+        """Escribe un bloque de filas; devuelve bytes escritos."""
+        import pyarrow as pa
+
+        data = pa.table(dict(zip(columns, map(list, zip(*rows)))))
+        seq = self._seq.get(table, 0)
+        self._seq[table] = seq + 1
+        ext = "parquet" if self.fmt == "parquet" else "csv.gz"
+        name = f"{self.part_prefix}part-{seq:05d}.{ext}"
+        base = os.path.join(self.output_dir, table)
+
+        if partition is None:
+            return self._write_file(data, os.path.join(base, name))
+
+        keys, inverse = np.unique(
+            partition.astype("datetime64[M]"), return_inverse=True
+        )
+        jobs = [
+            (
+                data.take(pa.array(np.flatnonzero(inverse == k))),
+                os.path.join(base, f"month={key}", name),
+            )
+            for k, key in enumerate(keys.astype(str))
+        ]
+        with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as ex:
+            return sum(ex.map(lambda job: self._write_file(*job), jobs))
+
 
 # --------------------------------------------------------------------------------------
 # Clase principal
 # --------------------------------------------------------------------------------------
 class DataGenerator:
-    def __init__(self, db_conf: dict):
+    def __init__(
+        self,
+        db_conf: dict,
+        seed: int = SEED,
+        loader: str = "batch",
+        commit_every: int | None = None,
+        identity_pool_size: int = 50_000,
+        output: str = "postgres",
+        output_dir: str = RAW_DIR,
+        part_prefix: str = "",
+        validate: str | None = None,
+    ):
+        if loader not in LOADER_MODES:
+            raise ValueError(f"loader debe ser uno de {LOADER_MODES}: {loader!r}")
+        if output not in OUTPUT_MODES:
+            raise ValueError(f"output debe ser uno de {OUTPUT_MODES}: {output!r}")
+        validate = validate or ("db" if output == "postgres" else "memory")
+        if validate not in VALIDATION_MODES:
+            raise ValueError(
+                f"validate debe ser uno de {VALIDATION_MODES}: {validate!r}"
+            )
+        if validate == "db" and output != "postgres":
+            raise ValueError("validate='db' requiere output='postgres'.")
         self.db_conf = db_conf
+        self.output = output
+        self.output_dir = output_dir
+        self.part_prefix = part_prefix
+        self.sink = (
+            None if output == "postgres" else FileSink(output_dir, output, part_prefix)
+        )
+        self.loader = loader
+        self.commit_every = commit_every  # filas por commit (None = por defecto)
+        self.load_stats = {}  # tabla -> filas, segundos, filas/seg, bytes
+        self.stage_metrics = {}  # etapa -> wall, cpu, filas/seg, RSS, bytes
+        self.run_config = {}  # parámetros de la ejecución (CLI) para el resumen
+        self.live_stats = None  # totales del modo continuo (run_live)
+        self.validate = validate
+        self.quality = {}  # check -> violaciones, muestra de claves, segundos
+        self._quality_refs = None
+        self.deferred = None  # índices/constraints borrados para la carga masiva
+        self.index_rebuild = None  # tiempos de reconstrucción + ANALYZE
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)  # motor vectorizado (reproducible)
+        self.identity_pool_size = identity_pool_size
+        self._identities = None
+        # Grafo en memoria: tabla -> columnas (np.ndarray) con ids asignados en
+        # cliente; las etapas se pasan los datos sin releer la DB.
+        self.graph = {}
         self.conn = None
         self.cur = None
         self.counters = {
@@ -126,6 +491,9 @@ class DataGenerator:
 
     # ---------------- Infra ----------------
     def connect(self):
+        if self.sink:
+            logging.info(f"📁 Salida a archivos ({self.output}) en {self.output_dir}")
+            return
         try:
             self.conn = psycopg2.connect(**self.db_conf)
             self.cur = self.conn.cursor()
@@ -142,11 +510,36 @@ class DataGenerator:
         logging.info("🔚 Conexión cerrada.")
 
     # ---------------- Helpers ----------------
+    def _ensure_identity_pool(self) -> IdentityPool:
+        """Abre (o genera y publica en el cache) el pool de identidades."""
+        if self._identities is None:
+            self._identities = IdentityPool.load_or_build(
+                self.identity_pool_size, seed=self.seed
+            )
+        return self._identities
+
+    @property
+    def identities(self) -> IdentityPool:
+        """Pool de identidades (se abre/genera en el primer uso)."""
+        return self._ensure_identity_pool()
+
     @staticmethod
-    def _gen_plate() -> str:
-        letters = "".join(random.choices(string.ascii_uppercase, k=3))
-        digits = f"{random.randint(100, 999)}"
-        return f"{letters}{digits}"
+    def _gen_plates(count: int) -> list:
+        """
+        'count' placas ABC123 distintas (license_plate es UNIQUE): se muestrean
+        sin reemplazo índices del espacio 26³ x 900 y se decodifican.
+        """
+        letters = string.ascii_uppercase
+        plates = []
+        for idx in random.sample(range(26**3 * 900), count):
+            code, digits = divmod(idx, 900)
+            plates.append(
+                letters[code // 676]
+                + letters[code // 26 % 26]
+                + letters[code % 26]
+                + str(100 + digits)
+            )
+        return plates
 
     @staticmethod
     def _toll_cost_from_distance(km: float) -> int:
@@ -189,57 +582,463 @@ class DataGenerator:
         return full
 
     @staticmethod
-    def _distribute_weight_lognormal(total_weight: float, num_packages: int):
-        """Distribuye total_weight en num_packages usando lognormal truncada."""
-        raw = np.random.lognormal(mean=2.5, sigma=0.6, size=num_packages)
+    def _distribute_weight_lognormal(
+        rng: np.random.Generator, total_weight: np.ndarray, num_packages: np.ndarray
+    ) -> np.ndarray:
+        """
+        Distribuye total_weight[j] en num_packages[j] paquetes (lognormal
+        truncada) para TODOS los trips con un único sorteo: normaliza por
+        segmento con np.add.reduceat y reparte con np.repeat.
+        """
+        raw = rng.lognormal(mean=2.5, sigma=0.6, size=int(num_packages.sum()))
         raw = np.clip(raw, 0.5, None)  # mínimo 0.5 kg
-        scaled = raw / raw.sum() * (total_weight * 0.95)  # deja 5% como colchón
-        return scaled
+        starts = np.concatenate(([0], np.cumsum(num_packages[:-1], dtype=np.int64)))
+        seg_sum = np.add.reduceat(raw, starts)
+        scale = total_weight * 0.95 / seg_sum  # deja 5% como colchón
+        return raw * np.repeat(scale, num_packages)
+
+    # ---------------- Carga (execute_batch / COPY) ----------------
+    @staticmethod
+    def _copy_text_value(v) -> str:
+        """Codifica un valor Python al formato texto de COPY."""
+        if v is None:
+            return "\\N"
+        if isinstance(v, bool):
+            return "t" if v else "f"
+        if isinstance(v, datetime):
+            return v.isoformat(sep=" ")
+        if isinstance(v, str):
+            return (
+                v.replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+        return str(v)  # int, float, Decimal, date
+
+    @property
+    def _bulk_commit_every(self) -> int | None:
+        """
+        Granularidad de commit de trips/deliveries: BATCH_COMMIT_ROWS con
+        execute_batch; en copy se deja a COPY_CHUNK_ROWS.
+        """
+        return BATCH_COMMIT_ROWS if self.loader == "batch" else None
+
+    def _copy_chunk(self, table: str, columns: tuple, rows: list) -> int:
+        """
+        Envía un bloque de filas con COPY … FROM STDIN desde un buffer en memoria.
+        Devuelve el tamaño del payload (caracteres de texto COPY).
+        """
+        enc = self._copy_text_value
+        buf = io.StringIO()
+        buf.writelines("\t".join(map(enc, row)) + "\n" for row in rows)
+        size = buf.tell()
+        buf.seek(0)
+        self.cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)", buf
+        )
+        return size
+
+    def _load(
+        self,
+        table: str,
+        columns: tuple,
+        rows,
+        page_size: int = 500,
+        commit_every: int | None = None,
+        partition: np.ndarray | None = None,
+        verbose: bool = True,
+    ) -> int:
+        """
+        Inserta 'rows' (iterable de tuplas) en 'table' según self.loader.
+        - batch: execute_batch con page_size
+        - copy:  COPY … FROM STDIN (formato texto)
+        - salida a archivos: un part por bloque (particionado por mes si se
+          pasa 'partition', un datetime64 por fila)
+        Hace commit cada 'commit_every' filas (self.commit_every tiene
+        prioridad; en copy, COPY_CHUNK_ROWS si ninguno la fija) y acumula
+        filas/seg por tabla en self.load_stats. 'verbose' controla el log por
+        llamada (el modo continuo carga lotes pequeños cada tick).
+        """
+        if self.sink:
+            commit_every = None  # un archivo por llamada salvo granularidad explícita
+        elif self.loader == "copy":
+            commit_every = commit_every or COPY_CHUNK_ROWS
+        chunk_rows = self.commit_every or commit_every
+        mode = self.output if self.sink else self.loader
+
+        placeholders = ", ".join(["%s"] * len(columns))
+        q = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+        it = iter(rows)
+        total = 0
+        nbytes = None if mode == "batch" else 0  # execute_batch no informa bytes
+        t0 = time.perf_counter()
+        while True:
+            chunk = list(islice(it, chunk_rows)) if chunk_rows else list(it)
+            if not chunk:
+                break
+            if self.sink:
+                part = None
+                if partition is not None:
+                    part = partition[total : total + len(chunk)]
+                nbytes += self.sink.write(table, columns, chunk, part)
+            elif self.loader == "copy":
+                nbytes += self._copy_chunk(table, columns, chunk)
+                self.conn.commit()
+            else:
+                execute_batch(self.cur, q, chunk, page_size=page_size)
+                self.conn.commit()
+            total += len(chunk)
+            if not chunk_rows:
+                break
+        elapsed = time.perf_counter() - t0
+
+        st = self.load_stats.setdefault(
+            table,
+            {
+                "loader": mode,
+                "rows": 0,
+                "seconds": 0.0,
+                "bytes": None if nbytes is None else 0,
+            },
+        )
+        st["rows"] += total
+        if nbytes:
+            st["bytes"] += nbytes
+        st["seconds"] = round(st["seconds"] + elapsed, 4)
+        st["rows_per_sec"] = (
+            round(st["rows"] / st["seconds"], 1) if st["seconds"] else None
+        )
+        if verbose:
+            logging.info(
+                f"⏱ {table}: {total:,} filas en {elapsed:.2f}s "
+                f"({total / elapsed if elapsed else 0:,.0f} filas/s, {mode})"
+            )
+        return total
+
+    def _sync_sequence(self, table: str, id_col: str, last_id: int):
+        """Deja la secuencia SERIAL en 'last_id' tras insertar ids explícitos."""
+        if self.sink:
+            return
+        self.cur.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, %s), GREATEST(%s, 1), %s)",
+            (table, id_col, last_id, last_id > 0),
+        )
+        self.conn.commit()
+
+    # ---------------- Métricas por etapa ----------------
+    @staticmethod
+    def _peak_rss_mb() -> float | None:
+        """RSS pico del proceso (y del mayor hijo, p. ej. workers) en MB."""
+        if resource is None:
+            return None
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes vs KB
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        return round(peak * 1024 / scale / 1024, 1)
+
+    def _bytes_written(self, tables: tuple) -> int | None:
+        """Bytes cargados en 'tables'; None si algún loader no los informa."""
+        sizes = [self.load_stats.get(t, {}).get("bytes", 0) for t in tables]
+        return None if None in sizes else sum(sizes)
+
+    @contextmanager
+    def stage(self, name: str, tables: tuple):
+        """
+        Mide una etapa: wall, CPU (incluye procesos hijo), filas y bytes
+        escritos en 'tables' y filas/seg; queda en self.stage_metrics.
+        ru_maxrss es el pico de todo el proceso, así que se reporta como tal
+        (process_peak_rss_mb) junto con cuánto lo subió la etapa
+        (peak_rss_growth_mb, 0 si no superó un pico anterior). bytes_written
+        es None si algún loader no informa bytes (execute_batch).
+        """
+        rows0 = sum(self.counters[t] for t in tables)
+        bytes0 = self._bytes_written(tables)
+        rss0 = self._peak_rss_mb()
+        cpu0 = sum(os.times()[:4])
+        t0 = time.perf_counter()
+        yield
+        wall = time.perf_counter() - t0
+        rows = sum(self.counters[t] for t in tables) - rows0
+        rss = self._peak_rss_mb()
+        nbytes = self._bytes_written(tables)
+        self.stage_metrics[name] = {
+            "rows": rows,
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(sum(os.times()[:4]) - cpu0, 3),
+            "rows_per_sec": round(rows / wall, 1) if wall else None,
+            "process_peak_rss_mb": rss,
+            "peak_rss_growth_mb": None if rss is None else round(rss - rss0, 1),
+            "bytes_written": None if nbytes is None else nbytes - (bytes0 or 0),
+        }
+        logging.info(f"📈 Etapa {name}: {self.stage_metrics[name]}")
 
     # ---------------- Limpieza (TRUNCATE) ----------------
-    def truncate_all(self):
+    def truncate_all(self, tables=TABLES):
         """
         Limpia TODO antes de generar (orden seguro).
         CASCADE por si hay dependencias.
+        'tables' permite limpiar solo las tablas de las etapas seleccionadas.
         """
-        logging.info("🧹 TRUNCATE de todas las tablas…")
-        self.cur.execute("""
-            TRUNCATE TABLE deliveries, trips, maintenance, routes, drivers, vehicles
+        if self.sink:
+            logging.info(f"🧹 Limpiando {self.output_dir}…")
+            self.sink.clear(tables)
+            return
+        logging.info(f"🧹 TRUNCATE de {', '.join(tables)}…")
+        self.cur.execute(f"""
+            TRUNCATE TABLE {", ".join(tables)}
             RESTART IDENTITY CASCADE;
         """)
         self.conn.commit()
         logging.info("✔ Tablas truncadas y secuencias reiniciadas.")
 
+    # ---------------- Índices y FKs diferidos (carga masiva) ----------------
+    def _deferrable_ddl(self, tables) -> list:
+        """
+        Índices secundarios y constraints UNIQUE/FK de 'tables' con su DDL de
+        reconstrucción. Las PK se conservan (las usan las FKs y los ids).
+        """
+        self.cur.execute(
+            """
+            SELECT quote_ident(c.conname), c.conrelid::regclass::text, c.contype,
+                   pg_get_constraintdef(c.oid), pg_get_indexdef(c.conindid)
+            FROM pg_constraint c
+            WHERE c.conrelid = ANY(%s::regclass[]) AND c.contype IN ('u', 'f')
+            ORDER BY 2, 1
+            """,
+            (list(tables),),
+        )
+        items = [
+            {
+                "kind": "fk" if contype == "f" else "unique",
+                "name": name,
+                "table": table,
+                "constraint": condef,
+                "index": indexdef if contype == "u" else None,
+            }
+            for name, table, contype, condef, indexdef in self.cur.fetchall()
+        ]
+        self.cur.execute(
+            """
+            SELECT i.indexrelid::regclass::text, i.indrelid::regclass::text,
+                   pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = ANY(%s::regclass[])
+              AND NOT i.indisprimary
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c
+                  WHERE c.conindid = i.indexrelid AND c.contype IN ('p', 'u', 'x')
+              )
+            ORDER BY 2, 1
+            """,
+            (list(tables),),
+        )
+        items += [
+            {"kind": "index", "name": name, "table": table, "index": indexdef}
+            for name, table, indexdef in self.cur.fetchall()
+        ]
+        return items
+
+    def defer_indexes(self, tables=TABLES):
+        """
+        Registra y borra índices secundarios, UNIQUE y FKs de 'tables' antes de
+        la carga masiva (orden: FK -> UNIQUE -> índices). El DDL queda en
+        DEFERRED_DDL_PATH; si ya existe (ejecución anterior caída), se reutiliza.
+        """
+        if self.sink:
+            return
+        if os.path.exists(DEFERRED_DDL_PATH):
+            with open(DEFERRED_DDL_PATH, encoding="utf-8") as f:
+                self.deferred = json.load(f)
+            logging.warning(
+                f"♻️ Índices ya diferidos por una ejecución anterior "
+                f"({len(self.deferred)} objetos en {DEFERRED_DDL_PATH})"
+            )
+            return
+
+        items = self._deferrable_ddl(tables)
+        os.makedirs(os.path.dirname(DEFERRED_DDL_PATH), exist_ok=True)
+        tmp = DEFERRED_DDL_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f, indent=2)
+        os.replace(tmp, DEFERRED_DDL_PATH)
+
+        for kind in ("fk", "unique", "index"):
+            for it in (i for i in items if i["kind"] == kind):
+                if kind == "index":
+                    self.cur.execute(f"DROP INDEX {it['name']}")
+                else:
+                    self.cur.execute(
+                        f"ALTER TABLE {it['table']} DROP CONSTRAINT {it['name']}"
+                    )
+        self.conn.commit()
+        self.deferred = items
+        counts = {
+            k: sum(i["kind"] == k for i in items) for k in ("index", "unique", "fk")
+        }
+        logging.info(f"🗑 Diferidos para la carga: {counts}")
+
+    def _run_ddl_parallel(self, jobs: list, workers: int) -> list:
+        """
+        Ejecuta sentencias (dicts con 'sql') en paralelo, cada una en su propia
+        conexión autocommit con maintenance_work_mem ampliado. Devuelve los
+        jobs con sus segundos.
+        """
+
+        def run(job):
+            conn = psycopg2.connect(**self.db_conf)
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SET maintenance_work_mem = %s", (REBUILD_MAINTENANCE_WORK_MEM,)
+                    )
+                    t0 = time.perf_counter()
+                    cur.execute(job["sql"])
+                    seconds = round(time.perf_counter() - t0, 3)
+            finally:
+                conn.close()
+            logging.info(f"  🔧 {job['step']} {job['name']}: {seconds:.2f}s")
+            return {**job, "seconds": seconds}
+
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as ex:
+            return list(ex.map(run, jobs))
+
+    def rebuild_indexes(self, workers: int | None = None):
+        """
+        Reconstruye lo diferido por defer_indexes en paralelo:
+        1) CREATE [UNIQUE] INDEX de índices y de los UNIQUE (concurrentes)
+        2) ADD CONSTRAINT … UNIQUE USING INDEX (instantáneo)
+        3) ADD CONSTRAINT … FOREIGN KEY (valida con un scan por FK)
+        4) ANALYZE por tabla
+        Deja los tiempos de cada paso en self.index_rebuild.
+        """
+        if not self.deferred:
+            return
+        workers = workers or min(os.cpu_count() or 1, 8)
+        items = self.deferred
+        logging.info(
+            f"🔨 Reconstruyendo {len(items)} índices/constraints (workers={workers})…"
+        )
+        t0 = time.perf_counter()
+
+        steps = self._run_ddl_parallel(
+            [
+                {
+                    "step": "index",
+                    "name": i["name"],
+                    "table": i["table"],
+                    "sql": i["index"],
+                }
+                for i in items
+                if i["kind"] in ("index", "unique")
+            ],
+            workers,
+        )
+        steps += self._run_ddl_parallel(
+            [
+                {
+                    "step": "unique",
+                    "name": i["name"],
+                    "table": i["table"],
+                    "sql": f"ALTER TABLE {i['table']} ADD CONSTRAINT {i['name']} "
+                    f"UNIQUE USING INDEX {i['name']}",
+                }
+                for i in items
+                if i["kind"] == "unique"
+            ],
+            1,
+        )
+        steps += self._run_ddl_parallel(
+            [
+                {
+                    "step": "fk",
+                    "name": i["name"],
+                    "table": i["table"],
+                    "sql": f"ALTER TABLE {i['table']} ADD CONSTRAINT {i['name']} "
+                    f"{i['constraint']}",
+                }
+                for i in items
+                if i["kind"] == "fk"
+            ],
+            workers,
+        )
+        tables = sorted({i["table"] for i in items})
+        steps += self._run_ddl_parallel(
+            [
+                {"step": "analyze", "name": t, "table": t, "sql": f"ANALYZE {t}"}
+                for t in tables
+            ],
+            workers,
+        )
+
+        os.remove(DEFERRED_DDL_PATH)
+        self.deferred = None
+        elapsed = time.perf_counter() - t0
+        self.index_rebuild = {
+            "workers": workers,
+            "seconds": round(elapsed, 3),
+            "serial_seconds": round(sum(st["seconds"] for st in steps), 3),
+            "steps": [
+                {k: st[k] for k in ("step", "name", "table", "seconds")} for st in steps
+            ],
+        }
+        logging.info(f"✔ Índices y constraints reconstruidos en {elapsed:.2f}s")
+
     # ---------------- Generadores: Maestras ----------------
     def generate_vehicles(self, count: int = 200):
         logging.info(f"Generando {count} vehículos…")
         rows = []
-        for _ in range(count):
+        for license_plate in self._gen_plates(count):
             vtype, cap_min, cap_max, fuel, _cons = random.choice(VEHICLE_TYPES)
             capacity = random.randint(cap_min, cap_max)
-            license_plate = self._gen_plate()
             acquisition_date = fake.date_between(start_date="-5y", end_date="-1m")
             status = random.choices(["active", "maintenance"], weights=[90, 10], k=1)[0]
             rows.append(
                 (license_plate, vtype, capacity, fuel, acquisition_date, status)
             )
-        q = """
-            INSERT INTO vehicles
-                (license_plate, vehicle_type, capacity_kg, fuel_type, acquisition_date, status)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        execute_batch(self.cur, q, rows, page_size=500)
-        self.conn.commit()
+        self._load(
+            "vehicles",
+            (
+                "vehicle_id",
+                "license_plate",
+                "vehicle_type",
+                "capacity_kg",
+                "fuel_type",
+                "acquisition_date",
+                "status",
+            ),
+            [(i + 1, *row) for i, row in enumerate(rows)],
+        )
+        self._sync_sequence("vehicles", "vehicle_id", count)
+        self.graph["vehicles"] = {
+            "vehicle_id": np.arange(1, count + 1, dtype=np.int64),
+            "vehicle_type": np.array([r[1] for r in rows], dtype=object),
+            "capacity_kg": np.array([r[2] for r in rows], dtype=float),
+            "status": np.array([r[5] for r in rows], dtype=object),
+        }
         self.counters["vehicles"] = count
         logging.info(f"✔ {count} vehículos insertados.")
 
     def generate_drivers(self, count: int = 400):
         logging.info(f"Generando {count} conductores…")
+        pool = self.identities
+        if count <= pool.size:
+            name_idx = random.sample(range(pool.size), count)  # sin repetir
+        else:
+            name_idx = random.choices(range(pool.size), k=count)
+        first_names = pool.decode(pool.first_names[name_idx])
+        last_names = pool.decode(pool.last_names[name_idx])
         rows = []
         for i in range(count):
             employee_code = f"EMP{str(i + 1).zfill(4)}"
-            first_name = fake.first_name()
-            last_name = fake.last_name()
+            first_name = first_names[i]
+            last_name = last_names[i]
             license_number = f"{random.randint(10**9, 10**10 - 1)}"  # 10 dígitos
             license_expiry = fake.date_between(start_date="-1m", end_date="+3y")
             phone = f"3{random.randint(100000000, 999999999)}"
@@ -257,14 +1056,27 @@ class DataGenerator:
                     status,
                 )
             )
-        q = """
-            INSERT INTO drivers
-                (employee_code, first_name, last_name, license_number,
-                 license_expiry, phone, hire_date, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        execute_batch(self.cur, q, rows, page_size=500)
-        self.conn.commit()
+        self._load(
+            "drivers",
+            (
+                "driver_id",
+                "employee_code",
+                "first_name",
+                "last_name",
+                "license_number",
+                "license_expiry",
+                "phone",
+                "hire_date",
+                "status",
+            ),
+            [(i + 1, *row) for i, row in enumerate(rows)],
+        )
+        self._sync_sequence("drivers", "driver_id", count)
+        self.graph["drivers"] = {
+            "driver_id": np.arange(1, count + 1, dtype=np.int64),
+            "license_expiry": np.array([r[4] for r in rows], dtype="datetime64[D]"),
+            "status": np.array([r[7] for r in rows], dtype=object),
+        }
         self.counters["drivers"] = count
         logging.info(f"✔ {count} conductores insertados.")
 
@@ -351,263 +1163,570 @@ class DataGenerator:
                     break
 
         routes = routes[:count]
-        q = """
-            INSERT INTO routes
-                (route_code, origin_city, destination_city, distance_km,
-                 estimated_duration_hours, toll_cost)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        execute_batch(self.cur, q, routes, page_size=200)
-        self.conn.commit()
+        self._load(
+            "routes",
+            (
+                "route_id",
+                "route_code",
+                "origin_city",
+                "destination_city",
+                "distance_km",
+                "estimated_duration_hours",
+                "toll_cost",
+            ),
+            [(i + 1, *row) for i, row in enumerate(routes)],
+            page_size=200,
+        )
+        self._sync_sequence("routes", "route_id", len(routes))
+        self.graph["routes"] = {
+            "route_id": np.arange(1, len(routes) + 1, dtype=np.int64),
+            "destination_city": np.array([r[2] for r in routes], dtype=object),
+            "distance_km": np.array([r[3] for r in routes], dtype=float),
+            "estimated_duration_hours": np.array([r[4] for r in routes], dtype=float),
+        }
         self.counters["routes"] = len(routes)
         logging.info(f"✔ {len(routes)} rutas insertadas (solicitadas: {count}).")
 
     # ---------------- Generadores: Transaccionales ----------------
-    def generate_trips(self, count: int = 100_000):
+    def _build_trip_columns(
+        self,
+        rng: np.random.Generator,
+        count: int,
+        vehicles: dict,
+        drivers: np.ndarray,
+        routes: dict,
+        start_date: datetime,
+        now: datetime,
+        index_offset: int = 0,
+        total: int | None = None,
+        departure: np.ndarray | None = None,
+    ) -> dict:
         """
-        Genera viajes a lo largo de ~2 años.
-        - Hora de salida según distribución por horas (06–22 con picos)
-        - Duración ~ km/70 + 1h (ruido)
-        - Consumo por tipo de vehículo (L/100km)
+        Motor vectorizado de trips: muestrea todas las variables aleatorias como
+        arrays y calcula salida, llegada, combustible y estado con aritmética de
+        arrays (sin bucle Python por fila).
+        'index_offset'/'total' ubican el bloque dentro del total de trips (shards).
+        'departure' fija las salidas (datetime64[us]) en lugar de muestrearlas;
+        llegada y estado se calculan desde ellas.
+        Devuelve un dict columna -> np.ndarray.
         """
-        logging.info(f"Generando {count} trips…")
+        vi = rng.integers(0, len(vehicles["vehicle_id"]), size=count)
+        di = rng.integers(0, len(drivers), size=count)
+        ri = rng.integers(0, len(routes["route_id"]), size=count)
+
+        if departure is None:
+            # hora de salida con distribución (06–22) y minuto uniforme
+            p_hour = self._hourly_distribution_full_24()
+            hour = np.maximum(rng.choice(24, size=count, p=p_hour), 6)
+            minute = rng.integers(0, 60, size=count)
+
+        realism = rng.uniform(0.85, 1.15, size=count)
+        l100 = rng.uniform(vehicles["l100_min"][vi], vehicles["l100_max"][vi])
+        fuel_noise = rng.uniform(0.95, 1.05, size=count)
+        load_factor = rng.uniform(0.4, 0.9, size=count)
+
+        if departure is None:
+            # día de cada trip: repartido uniformemente en ~2 años
+            total = total or count
+            span_minutes = 2 * 365 * 24 * 60
+            minutes_step = span_minutes // total
+            idx = np.arange(index_offset, index_offset + count, dtype=np.int64)
+            offsets = (
+                idx * minutes_step if minutes_step else idx * span_minutes // total
+            )
+            day = (
+                np.datetime64(start_date, "m") + offsets.astype("timedelta64[m]")
+            ).astype("datetime64[D]")
+            departure = day.astype("datetime64[us]") + (hour * 60 + minute).astype(
+                "timedelta64[m]"
+            )
+
+        # duración real
+        distance = routes["distance_km"][ri]
+        base_dur = distance / 70.0 + 1.0
+        actual_dur = (
+            np.maximum(routes["estimated_duration_hours"][ri], base_dur) * realism
+        )
+        arrival = departure + np.round(actual_dur * 3_600_000_000).astype(
+            "timedelta64[us]"
+        )
+
+        fuel = distance * (l100 / 100.0) * fuel_noise
+        total_weight = vehicles["capacity_kg"][vi] * load_factor  # 40–90% capacidad
+        completed = arrival < np.datetime64(now, "us")
+
+        return {
+            "vehicle_id": vehicles["vehicle_id"][vi],
+            "driver_id": drivers[di],
+            "route_id": routes["route_id"][ri],
+            "destination_city": routes["destination_city"][ri],
+            "distance_km": distance,
+            "departure_datetime": departure,
+            "arrival_datetime": arrival,
+            "fuel_consumed_liters": np.round(fuel, 2),
+            "total_weight_kg": np.round(total_weight, 2),
+            "completed": completed,
+        }
+
+    def _load_trip_catalogs(self):
+        """
+        Catálogos activos (vehicles/drivers/routes) como arrays NumPy.
+        Salen del grafo en memoria; solo se consulta la DB si las maestras no
+        se generaron en esta ejecución.
+        """
+        cons_ranges = {vtype: cons for vtype, *_rest, cons in VEHICLE_TYPES}
+        if all(t in self.graph for t in ("vehicles", "drivers", "routes")):
+            v, d = self.graph["vehicles"], self.graph["drivers"]
+            active = v["status"] == "active"
+            cons = [cons_ranges.get(t, (10, 20)) for t in v["vehicle_type"][active]]
+            vehicles = {
+                "vehicle_id": v["vehicle_id"][active],
+                "capacity_kg": v["capacity_kg"][active],
+                "l100_min": np.array([c[0] for c in cons], dtype=float),
+                "l100_max": np.array([c[1] for c in cons], dtype=float),
+            }
+            drivers = d["driver_id"][d["status"] == "active"]
+            if not (len(vehicles["vehicle_id"]) and len(drivers)):
+                raise RuntimeError("Faltan datos base (vehicles/drivers/routes).")
+            return vehicles, drivers, self.graph["routes"]
 
-        # Catálogos desde DB
         self.cur.execute(
             "SELECT vehicle_id, capacity_kg, vehicle_type FROM vehicles WHERE status='active'"
         )
         vehicles = self.cur.fetchall()
 
         self.cur.execute("SELECT driver_id FROM drivers WHERE status='active'")
-        drivers = [d[0] for d in self.cur.fetchall()]
+        drivers = np.array([d[0] for d in self.cur.fetchall()], dtype=np.int64)
 
         self.cur.execute(
-            "SELECT route_id, distance_km, estimated_duration_hours FROM routes"
+            "SELECT route_id, distance_km, estimated_duration_hours, destination_city "
+            "FROM routes ORDER BY route_id"
         )
-        routes = [
-            (rid, float(dist), float(estim))
-            for (rid, dist, estim) in self.cur.fetchall()
-        ]
+        routes = self.cur.fetchall()
 
-        if not (vehicles and drivers and routes):
+        if not (vehicles and len(drivers) and routes):
             raise RuntimeError("Faltan datos base (vehicles/drivers/routes).")
 
-        start_date = datetime.now() - timedelta(days=730)  # ~2 años
-        current_dt = start_date
-        p_hour = self._hourly_distribution_full_24()
+        vehicles = {
+            "vehicle_id": np.array([v[0] for v in vehicles], dtype=np.int64),
+            "capacity_kg": np.array([float(v[1]) for v in vehicles]),
+            "l100_min": np.array(
+                [cons_ranges.get(v[2], (10, 20))[0] for v in vehicles], dtype=float
+            ),
+            "l100_max": np.array(
+                [cons_ranges.get(v[2], (10, 20))[1] for v in vehicles], dtype=float
+            ),
+        }
+        routes = {
+            "route_id": np.array([r[0] for r in routes], dtype=np.int64),
+            "distance_km": np.array([float(r[1]) for r in routes]),
+            "estimated_duration_hours": np.array([float(r[2]) for r in routes]),
+            "destination_city": np.array([r[3] for r in routes], dtype=object),
+        }
+        return vehicles, drivers, routes
+
+    @staticmethod
+    def _trip_rows(cols: dict, first_trip_id: int | None = None) -> list:
+        """
+        Convierte las columnas del motor vectorizado en tuplas para _load.
+        Con 'first_trip_id' antepone trip_id explícito (ids asignados en cliente).
+        """
+        completed = cols["completed"]
+        arrival = cols["arrival_datetime"].astype(object)
+        arrival[~completed] = None
+        status = np.where(completed, "completed", "in_progress")
+
+        columns = [
+            cols["vehicle_id"].tolist(),
+            cols["driver_id"].tolist(),
+            cols["route_id"].tolist(),
+            cols["departure_datetime"].tolist(),
+            arrival.tolist(),
+            cols["fuel_consumed_liters"].tolist(),
+            cols["total_weight_kg"].tolist(),
+            status.tolist(),
+        ]
+        if first_trip_id is not None:
+            n = len(completed)
+            columns.insert(0, range(first_trip_id, first_trip_id + n))
+        return list(zip(*columns))
 
-        cons_ranges = {
-            "Camión Grande": (25, 35),
-            "Camión Mediano": (18, 26),
-            "Van": (9, 15),
-            "Motocicleta": (2, 4),
+    @staticmethod
+    def _vehicle_usage(cols: dict, n_slots: int) -> dict:
+        """
+        Agregados por vehicle_id (nº trips, km, primer y último viaje) a partir
+        de las columnas de trips; reemplaza el LEFT JOIN + GROUP BY en la DB.
+        Arrays indexados por vehicle_id; fechas como int64 (µs).
+        """
+        vid = cols["vehicle_id"]
+        departure = cols["departure_datetime"]
+        end = np.where(cols["completed"], cols["arrival_datetime"], departure)
+        first = np.full(n_slots, np.iinfo(np.int64).max)
+        last = np.full(n_slots, np.iinfo(np.int64).min)
+        np.minimum.at(first, vid, departure.view(np.int64))
+        np.maximum.at(last, vid, end.view(np.int64))
+        return {
+            "trip_count": np.bincount(vid, minlength=n_slots),
+            "total_km": np.bincount(
+                vid, weights=cols["distance_km"], minlength=n_slots
+            ),
+            "first": first,
+            "last": last,
         }
 
-        rows = []
-        minutes_step = int(2 * 365 * 24 * 60 / count)  # repartir uniformemente
-
-        for _ in range(count):
-            vehicle_id, capacity, vtype = random.choice(vehicles)
-            driver_id = random.choice(drivers)
-            route_id, distance, est_dur = random.choice(routes)
-            distance = float(distance)
-
-            # hora de salida con distribución
-            hour = np.random.choice(range(24), p=p_hour)
-            if hour < 6:
-                hour = 6
-            departure = current_dt.replace(
-                hour=int(hour), minute=random.randint(0, 59), second=0, microsecond=0
-            )
+    def _add_vehicle_usage(self, usage: dict):
+        """Acumula agregados por vehículo (p. ej. de varios shards) en el grafo."""
+        acc = self.graph.get("vehicle_usage")
+        if acc is None:
+            self.graph["vehicle_usage"] = {k: v.copy() for k, v in usage.items()}
+            return
+        acc["trip_count"] += usage["trip_count"]
+        acc["total_km"] += usage["total_km"]
+        np.minimum(acc["first"], usage["first"], out=acc["first"])
+        np.maximum(acc["last"], usage["last"], out=acc["last"])
+
+    def generate_trips(self, count: int = 100_000, shard_size: int = 250_000):
+        """
+        Genera viajes a lo largo de ~2 años.
+        - Hora de salida según distribución por horas (06–22 con picos)
+        - Duración ~ km/70 + 1h (ruido)
+        - Consumo por tipo de vehículo (L/100km)
+        Se genera y carga por shards de 'shard_size' trips, con la misma
+        semilla y rango de ids que el modo por shards: la memoria no depende
+        de 'count' y los trips salen iguales con cualquier --workers. El grafo
+        guarda solo las columnas que necesitan las entregas.
+        """
+        logging.info(f"Generando {count} trips…")
 
-            # duración real
-            base_dur = (distance / 70.0) + 1.0
-            realism = random.uniform(0.85, 1.15)
-            actual_dur = max(est_dur, base_dur) * realism
-            arrival = departure + timedelta(hours=actual_dur)
+        catalogs = self._load_trip_catalogs()
+        now = datetime.now()
+        start_date = now - timedelta(days=730)  # ~2 años
+        n_slots = int(catalogs[0]["vehicle_id"].max()) + 1
+        parts = []
+        with self._in_process_shards():
+            for shard in self._plan_shards(count, 0, shard_size):
+                cols, trip_id = self._shard_trips(
+                    self._start_shard(self.seed, shard["shard"]),
+                    shard["trip_offset"],
+                    shard["n_trips"],
+                    count,
+                    catalogs,
+                    start_date,
+                    now,
+                )
+                self._add_vehicle_usage(self._vehicle_usage(cols, n_slots))
+                parts.append(
+                    {"trip_id": trip_id, **{c: cols[c] for c in TRIP_GRAPH_COLUMNS}}
+                )
+        self._sync_sequence("trips", "trip_id", count)
+        self.graph["trips"] = {
+            c: np.concatenate([part[c] for part in parts]) for c in parts[0]
+        }
+        self.counters["trips"] = count
+        logging.info(f"✔ {count} trips insertados.")
 
-            # consumo
-            l100 = random.uniform(*cons_ranges.get(vtype, (10, 20)))
-            fuel = distance * (l100 / 100.0) * random.uniform(0.95, 1.05)
+    @staticmethod
+    def _sample_delivery_counts(rng: np.random.Generator, n_trips: int) -> np.ndarray:
+        """Entregas por trip 2..6 con 4 como más probable (int8, 1 byte/trip)."""
+        choices = np.array([2, 3, 4, 5, 6], dtype=np.int8)
+        probs = np.array([0.10, 0.20, 0.40, 0.20, 0.10])  # E[n] = 4.0
+        return rng.choice(choices, size=n_trips, p=probs)
 
-            # peso total 40–90% de capacidad
-            total_weight = float(capacity) * random.uniform(0.4, 0.9)
+    @staticmethod
+    def _fit_delivery_counts(per_trip: np.ndarray, target: int):
+        """
+        Ajusta in-place 'per_trip' para que sume exactamente 'target'
+        respetando 2 <= per_trip[i] <= 6. Forma cerrada del recorrido circular
+        trip a trip: k rondas completas dan min(holgura, k) a cada trip y el
+        resto va, en orden, a los primeros trips con holgura > k.
+        """
+        diff = target - int(per_trip.sum(dtype=np.int64))
+        if diff == 0:
+            return
 
-            status = "completed" if arrival < datetime.now() else "in_progress"
+        if diff > 0:
+            # capacidad para subir hasta 6 por trip
+            slack = 6 - per_trip
+            step = 1
+            msg = "No hay capacidad para alcanzar el target con máximo 6 por trip."
+        else:
+            # bajar hasta 2 por trip
+            slack = per_trip - 2
+            step = -1
+            msg = "No es posible reducir hasta el target manteniendo mínimo 2 por trip."
+        need = abs(diff)
+        if slack.sum(dtype=np.int64) < need:
+            raise RuntimeError(msg)
+
+        # rondas completas: mayor k con sum(min(slack, k)) <= need (k <= 4)
+        k = 0
+        while k < 4 and np.minimum(slack, k + 1).sum(dtype=np.int64) <= need:
+            k += 1
+        given = np.minimum(slack, k)
+        rest = need - int(given.sum(dtype=np.int64))
+        if rest:
+            extra = np.flatnonzero(slack > k)[:rest]
+            given[extra] += 1
+        per_trip += (step * given).astype(per_trip.dtype)
 
-            rows.append(
-                (
-                    vehicle_id,
-                    driver_id,
-                    route_id,
-                    departure,
-                    arrival if status == "completed" else None,
-                    round(fuel, 2),
-                    round(total_weight, 2),
-                    status,
-                )
+    @staticmethod
+    def _sample_delivery_delays(rng: np.random.Generator, n: int) -> np.ndarray:
+        """Desvío entrega vs programada: 90% a tiempo (+/- 30 min), 10% retraso 60–180 min."""
+        on_time = rng.random(n) < 0.9
+        minutes = np.where(
+            on_time,
+            rng.integers(-30, 31, n),
+            rng.integers(60, 181, n),
+        )
+        return minutes.astype("timedelta64[m]")
+
+    def _iter_trip_chunks(self, chunk_size: int):
+        """
+        Entrega bloques de trips como arrays (trip_id, departure, arrival con NaT
+        si sigue en curso, total_weight, destination_city).
+        - Desde el grafo en memoria si los trips se generaron en esta ejecución.
+        - Si no, con un cursor de servidor (named cursor WITH HOLD, sobrevive a
+          los commits de cada flush).
+        """
+        trips = self.graph.get("trips")
+        if trips is not None:
+            arrival = np.where(
+                trips["completed"], trips["arrival_datetime"], np.datetime64("NaT")
             )
+            for i in range(0, len(trips["trip_id"]), chunk_size):
+                sl = slice(i, i + chunk_size)
+                yield (
+                    trips["trip_id"][sl],
+                    trips["departure_datetime"][sl],
+                    arrival[sl],
+                    trips["total_weight_kg"][sl],
+                    trips["destination_city"][sl],
+                )
+            return
+
+        cur = self.conn.cursor(name="deliveries_trip_stream", withhold=True)
+        cur.itersize = chunk_size
+        try:
+            cur.execute("""
+                SELECT t.trip_id,
+                       t.departure_datetime,
+                       t.arrival_datetime,
+                       t.total_weight_kg,
+                       r.destination_city
+                FROM trips t
+                JOIN routes r ON r.route_id = t.route_id
+                WHERE t.status IN ('completed','in_progress')
+                ORDER BY t.trip_id
+            """)
+            while True:
+                chunk = cur.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                trip_id, departure, arrival, total_weight, dest_city = zip(*chunk)
+                yield (
+                    np.array(trip_id, dtype=np.int64),
+                    np.array(departure, dtype="datetime64[us]"),
+                    np.array(arrival, dtype="datetime64[us]"),  # None -> NaT
+                    np.array(total_weight, dtype=float),
+                    np.array(dest_city, dtype=object),
+                )
+        finally:
+            cur.close()
+
+    def _delivery_columns(
+        self,
+        rng: np.random.Generator,
+        trip_id: np.ndarray,
+        departure: np.ndarray,
+        arrival: np.ndarray,
+        total_weight: np.ndarray,
+        dest_city: np.ndarray,
+        per_trip: np.ndarray,
+        counter: int,
+        year: int | None = None,
+    ) -> dict:
+        """
+        Fan-out vectorizado trips -> deliveries para un bloque (arrays por trip,
+        'arrival' con NaT si el trip sigue en curso). Todas las columnas salen
+        de operaciones sobre arrays segmentados (np.repeat / reduceat).
+        'counter' es el último número de tracking emitido antes del bloque.
+        """
+        year = year or datetime.now().year
+        n = per_trip.astype(np.int64)
+        n_rows = int(n.sum())
+        starts = np.concatenate(([0], np.cumsum(n[:-1])))
+        pos = np.arange(n_rows) - np.repeat(starts, n)  # índice dentro del trip
+
+        # pesos por entrega (lognormal, escalado al 95% del total_weight)
+        weights = self._distribute_weight_lognormal(rng, total_weight, n)
+
+        # tiempo entre entregas: duración/n (mín. 1h) o 30 min si sigue en curso
+        completed = ~np.isnat(arrival)
+        hours = (arrival - departure) / np.timedelta64(1, "h")
+        gap = np.where(completed, np.maximum(hours, 1.0) / n, 0.5)
+        scheduled = np.repeat(departure, n) + np.round(
+            np.repeat(gap, n) * (pos + 0.5) * 3_600_000_000
+        ).astype("timedelta64[us]")
+
+        done = np.repeat(completed, n)
+        delivered = np.where(
+            done,
+            scheduled + self._sample_delivery_delays(rng, n_rows),
+            np.datetime64("NaT"),
+        )
+        signature = done & (rng.random(n_rows) < 0.95)
+
+        # identidades del bloque muestreadas en lote desde el pool
+        pool = self.identities
+        city_idx = np.array([pool.city_index[c] for c in dest_city], dtype=np.int64)
+        streets = pool.streets[
+            np.repeat(city_idx, n), rng.integers(0, pool.size, n_rows)
+        ]
 
-            current_dt += timedelta(minutes=minutes_step)
+        return {
+            "trip_id": np.repeat(trip_id, n),
+            "tracking_number": np.char.add(
+                f"FL{year}",
+                np.char.zfill(
+                    np.arange(counter + 1, counter + n_rows + 1).astype(str), 8
+                ),
+            ),
+            "customer_name": pool.full_names(rng.integers(0, pool.size, n_rows)),
+            "street": streets,
+            "city": np.repeat(dest_city, n),
+            "package_weight_kg": np.round(weights, 2),
+            "scheduled_datetime": scheduled,
+            "delivered_datetime": delivered,
+            "delivery_status": np.where(done, "delivered", "pending"),
+            "recipient_signature": signature,
+            "trip_departure": np.repeat(departure, n),  # partición en archivos
+        }
 
-        q = """
-            INSERT INTO trips
-                (vehicle_id, driver_id, route_id, departure_datetime,
-                 arrival_datetime, fuel_consumed_liters, total_weight_kg, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    @staticmethod
+    def _delivery_rows(cols: dict, first_delivery_id: int | None = None) -> list:
         """
-        batch = 2000
-        for i in range(0, len(rows), batch):
-            execute_batch(self.cur, q, rows[i : i + batch], page_size=500)
-            self.conn.commit()
-        self.counters["trips"] = count
-        logging.info(f"✔ {count} trips insertados.")
+        Convierte las columnas de _delivery_columns en tuplas para _load.
+        Con 'first_delivery_id' antepone delivery_id explícito.
+        """
+        address = [
+            f"{street}, {city}"
+            for street, city in zip(
+                IdentityPool.decode(cols["street"]), cols["city"].tolist()
+            )
+        ]
+        columns = [
+            cols["trip_id"].tolist(),
+            cols["tracking_number"].tolist(),
+            cols["customer_name"],
+            address,
+            cols["package_weight_kg"].tolist(),
+            cols["scheduled_datetime"].tolist(),
+            cols["delivered_datetime"].tolist(),  # NaT -> None
+            cols["delivery_status"].tolist(),
+            cols["recipient_signature"].tolist(),
+        ]
+        if first_delivery_id is not None:
+            n = len(address)
+            columns.insert(0, range(first_delivery_id, first_delivery_id + n))
+        return list(zip(*columns))
 
-    def generate_deliveries(self, target: int = 400_000):
+    def generate_deliveries(self, target: int = 400_000, chunk_size: int = 50_000):
         """
         Genera EXACTAMENTE 'target' entregas.
         - Por trip: 2–6 entregas, con 4 como lo más probable (ajustado para sumar 'target').
         - Si el trip está 'completed', se programan y marcan delivered (10% con retraso).
         - Si está 'in_progress', quedan 'pending'.
+        Streaming: los trips se recorren por bloques de 'chunk_size' (grafo en
+        memoria o cursor de servidor) y cada bloque se genera y se escribe antes
+        de pasar al siguiente; además solo vive el conteo por trip (1 byte/trip).
+        Muestrea con self.rng, no con los generadores por shard: con la misma
+        semilla el resultado es reproducible, pero distinto del de
+        generate_trips_and_deliveries_parallel (allí cada shard consume su
+        generador primero en los trips, que aquí ya existen).
         """
         logging.info(f"Generando {target} deliveries…")
 
-        # Traer trips con su info necesaria
-        self.cur.execute("""
-            SELECT t.trip_id,
-                   t.departure_datetime,
-                   t.arrival_datetime,
-                   t.total_weight_kg,
-                   r.destination_city
-            FROM trips t
-            JOIN routes r ON r.route_id = t.route_id
-            WHERE t.status IN ('completed','in_progress')
-            ORDER BY t.trip_id
-        """)
-        trips = self.cur.fetchall()
-        n_trips = len(trips)
+        if "trips" in self.graph:
+            n_trips = len(self.graph["trips"]["trip_id"])
+        else:
+            self.cur.execute(
+                "SELECT COUNT(*) FROM trips WHERE status IN ('completed','in_progress')"
+            )
+            n_trips = self.cur.fetchone()[0]
         if n_trips == 0:
             raise RuntimeError("No hay trips para generar deliveries.")
 
         # 1) Muestra inicial 2..6 con 4 como más probable
-        choices = np.array([2, 3, 4, 5, 6])
-        probs = np.array([0.10, 0.20, 0.40, 0.20, 0.10])  # E[n] = 4.0
-        per_trip = np.random.choice(choices, size=n_trips, p=probs)
+        per_trip = self._sample_delivery_counts(self.rng, n_trips)
 
         # 2) Ajustar para que sum(per_trip) == target sin pasar de 6
-        current_total = int(per_trip.sum())
-        diff = target - current_total
-
-        if diff > 0:
-            # capacidad para subir hasta 6 por trip
-            capacity = (6 - per_trip).sum()
-            if capacity < diff:
-                raise RuntimeError(
-                    "No hay capacidad para alcanzar el target con máximo 6 por trip."
-                )
-            # incrementa secuencialmente evitando pasar de 6
-            i = 0
-            while diff > 0:
-                if per_trip[i] < 6:
-                    per_trip[i] += 1
-                    diff -= 1
-                i = (i + 1) % n_trips
-
-        elif diff < 0:
-            # bajar hasta 2 por trip
-            need = -diff
-            capacity = (per_trip - 2).sum()
-            if capacity < need:
-                raise RuntimeError(
-                    "No es posible reducir hasta el target manteniendo mínimo 2 por trip."
-                )
-            i = 0
-            while need > 0:
-                if per_trip[i] > 2:
-                    per_trip[i] -= 1
-                    need -= 1
-                i = (i + 1) % n_trips
+        self._fit_delivery_counts(per_trip, target)
 
         # ahora sum(per_trip) == target y 2 <= per_trip[i] <= 6
-        rows = []
-        counter = 0
-
-        for (trip_id, departure, arrival, total_weight, dest_city), n in zip(
-            trips, per_trip
-        ):
-            # pesos por entrega (lognormal, escalado al 95% del total_weight)
-            total_weight = float(total_weight)
-            weights = self._distribute_weight_lognormal(total_weight, int(n))
-
-            # tiempo entre entregas
-            if arrival:
-                total_hours = max((arrival - departure).total_seconds() / 3600.0, 1.0)
-                gap = total_hours / n
-            else:
-                gap = 0.5  # 30 minutos aprox.
-
-            for i in range(int(n)):
-                counter += 1
-                tracking = f"FL{datetime.now().year}{str(counter).zfill(8)}"
-                customer_name = f"{fake.first_name()} {fake.last_name()}"
-                address = f"{fake.street_address()}, {dest_city}"
-                pkg_w = round(float(weights[i]), 2)
-
-                scheduled = departure + timedelta(hours=gap * (i + 0.5))
-
-                if arrival:
-                    # 90% a tiempo (+/- 30 min), 10% retraso 60–180 min
-                    if random.random() < 0.9:
-                        delivered = scheduled + timedelta(
-                            minutes=random.randint(-30, 30)
-                        )
-                    else:
-                        delivered = scheduled + timedelta(
-                            minutes=random.randint(60, 180)
-                        )
-                    status = "delivered"
-                    signature = random.random() < 0.95
-                else:
-                    delivered = None
-                    status = "pending"
-                    signature = False
-
-                rows.append(
-                    (
-                        trip_id,
-                        tracking,
-                        customer_name,
-                        address,
-                        pkg_w,
-                        scheduled,
-                        delivered,
-                        status,
-                        signature,
-                    )
-                )
-
-        # Inserción por lotes
-        q = """
-            INSERT INTO deliveries
-              (trip_id, tracking_number, customer_name, delivery_address,
-               package_weight_kg, scheduled_datetime, delivered_datetime,
-               delivery_status, recipient_signature)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        batch = 2000
-        for i in range(0, len(rows), batch):
-            execute_batch(self.cur, q, rows[i : i + batch], page_size=500)
-            self.conn.commit()
+        # 3) Streaming: leer bloque -> generar -> flush -> siguiente bloque
+        counter = 0  # secuencia global de tracking FL<año><counter>
+        offset = 0
+        for (
+            trip_id,
+            departure,
+            arrival,
+            total_weight,
+            dest_city,
+        ) in self._iter_trip_chunks(chunk_size):
+            cols = self._delivery_columns(
+                self.rng,
+                trip_id,
+                departure,
+                arrival,
+                total_weight,
+                dest_city,
+                per_trip[offset : offset + len(trip_id)],
+                counter,
+            )
+            self._validate_deliveries_in_memory(cols, trip_id, counter + 1)
+            counter += self._load(
+                "deliveries",
+                ("delivery_id",) + DELIVERY_COLUMNS,
+                self._delivery_rows(cols, first_delivery_id=counter + 1),
+                commit_every=self._bulk_commit_every,
+                partition=cols["trip_departure"],
+            )
+            offset += len(trip_id)
 
-        self.counters["deliveries"] = len(rows)
-        logging.info(f"✔ {len(rows)} deliveries insertados (objetivo: {target}).")
+        self._sync_sequence("deliveries", "delivery_id", counter)
+        self.counters["deliveries"] = counter
+        logging.info(f"✔ {counter} deliveries insertados (objetivo: {target}).")
 
-    def generate_maintenance(self, target: int = 5000):
+    def _vehicle_stats(self) -> list:
         """
-        Genera mantenimientos por vehículo cada ~10.000 km (±300).
-        Las fechas se distribuyen entre primer y último viaje del vehículo.
+        (vehicle_id, vehicle_type, trip_count, first_trip, last_trip, total_km)
+        por vehículo. Sale de los agregados del grafo; si los trips no se
+        generaron en esta ejecución se calcula en la DB.
         """
-        logging.info(f"Generando {target} registros de maintenance…")
+        usage = self.graph.get("vehicle_usage")
+        if usage is not None and "vehicles" in self.graph:
+            v = self.graph["vehicles"]
+            vid = v["vehicle_id"]
+            # los arrays llegan hasta el mayor id activo: los inactivos por
+            # encima no tienen trips
+            n = len(usage["trip_count"])
+            pos = np.minimum(vid, n - 1)
+            count = np.where(vid < n, usage["trip_count"][pos], 0)
+            has = count > 0
+            first = np.where(has, usage["first"][pos], 0).view("datetime64[us]")
+            last = np.where(has, usage["last"][pos], 0).view("datetime64[us]")
+            km = np.where(has, usage["total_km"][pos], 0.0)
+            return [
+                (i, t, c, f if c else None, la if c else None, km)
+                for i, t, c, f, la, km in zip(
+                    vid.tolist(),
+                    v["vehicle_type"].tolist(),
+                    count.tolist(),
+                    first.tolist(),
+                    last.tolist(),
+                    km.tolist(),
+                )
+            ]
 
         self.cur.execute("""
             SELECT v.vehicle_id,
@@ -622,7 +1741,16 @@ class DataGenerator:
             GROUP BY v.vehicle_id, v.vehicle_type
             ORDER BY v.vehicle_id
         """)
-        stats = self.cur.fetchall()
+        return self.cur.fetchall()
+
+    def generate_maintenance(self, target: int = 5000):
+        """
+        Genera mantenimientos por vehículo cada ~10.000 km (±300).
+        Las fechas se distribuyen entre primer y último viaje del vehículo.
+        """
+        logging.info(f"Generando {target} registros de maintenance…")
+        stats = self._vehicle_stats()
+        technicians = IdentityPool.decode(self.identities.technicians)
         rows = []
 
         for vehicle_id, vtype, trip_count, first_trip, last_trip, total_km in stats:
@@ -647,7 +1775,7 @@ class DataGenerator:
                 maint_type, base_cost, days_next = random.choice(MAINTENANCE_TYPES)
                 cost = round(base_cost * random.uniform(0.85, 1.20), 2)
                 next_m = m_date + timedelta(days=days_next)
-                performed_by = f"{fake.first_name()} {fake.last_name()}"
+                performed_by = random.choice(technicians)
                 desc = f"{maint_type} programado"
 
                 rows.append(
@@ -659,78 +1787,758 @@ class DataGenerator:
             if len(rows) >= target:
                 break
 
-        q = """
-            INSERT INTO maintenance
-                (vehicle_id, maintenance_date, maintenance_type,
-                 description, cost, next_maintenance_date, performed_by)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        rows = rows[:target]
+        self._load(
+            "maintenance",
+            (
+                "maintenance_id",
+                "vehicle_id",
+                "maintenance_date",
+                "maintenance_type",
+                "description",
+                "cost",
+                "next_maintenance_date",
+                "performed_by",
+            ),
+            [(i + 1, *row) for i, row in enumerate(rows)],
+        )
+        self._sync_sequence("maintenance", "maintenance_id", len(rows))
+        self.counters["maintenance"] = len(rows)
+        logging.info(
+            f"✔ {self.counters['maintenance']} maintenance insertados (objetivo: {target})."
+        )
+
+    # ---------------- Generación paralela (shards) ----------------
+    @staticmethod
+    def shard_seed(seed: int, shard: int) -> int:
+        """Semilla determinística de un shard derivada de (seed, shard)."""
+        return int(np.random.SeedSequence([seed, shard]).generate_state(1)[0])
+
+    def _start_shard(self, seed: int, shard: int) -> np.random.Generator:
+        """
+        Generador propio del shard (todo su muestreo sale de él, no del estado
+        global) y, con salida a archivos, numera sus parts con su prefijo.
+        """
+        if self.sink:
+            self.sink.start_parts(f"shard{shard:05d}-")
+        return np.random.default_rng(self.shard_seed(seed, shard))
+
+    @contextmanager
+    def _in_process_shards(self):
+        """Shards en este proceso: al terminar, las parts vuelven a su prefijo."""
+        try:
+            yield
+        finally:
+            if self.sink:
+                self.sink.start_parts(self.part_prefix)
+
+    def _shard_trips(
+        self,
+        rng: np.random.Generator,
+        trip_offset: int,
+        n_trips: int,
+        total_trips: int,
+        catalogs: tuple,
+        start_date: datetime,
+        now: datetime,
+    ) -> tuple:
+        """
+        Genera, valida y carga los trips [trip_offset, trip_offset+n) de un
+        shard con su generador 'rng'; devuelve (columnas, trip_id).
+        """
+        vehicles, drivers, routes = catalogs
+        cols = self._build_trip_columns(
+            rng,
+            n_trips,
+            vehicles,
+            drivers,
+            routes,
+            start_date,
+            now,
+            index_offset=trip_offset,
+            total=total_trips,
+        )
+        first_trip_id = trip_offset + 1
+        trip_id = np.arange(first_trip_id, first_trip_id + n_trips, dtype=np.int64)
+        self._validate_trips_in_memory(cols, trip_id)
+        self._load(
+            "trips",
+            ("trip_id",) + TRIP_COLUMNS,
+            self._trip_rows(cols, first_trip_id=first_trip_id),
+            commit_every=self._bulk_commit_every,
+            partition=cols["departure_datetime"],
+        )
+        return cols, trip_id
+
+    @staticmethod
+    def _plan_shards(n_trips: int, target: int, shard_size: int) -> list:
+        """
+        Parte trips/deliveries en shards de tamaño fijo (independiente del
+        número de workers). Cada shard recibe un rango propio de trip_id y de
+        delivery_id/tracking y un target proporcional; el resto se reparte en
+        los primeros shards para que la suma sea exactamente 'target'.
+        """
+        n_shards = -(-n_trips // shard_size)
+        sizes = [min(shard_size, n_trips - k * shard_size) for k in range(n_shards)]
+        targets = [target * n // n_trips for n in sizes]
+        for k in range(target - sum(targets)):
+            targets[k % n_shards] += 1
+
+        plan, trip_offset, delivery_offset = [], 0, 0
+        for k, (n, t) in enumerate(zip(sizes, targets)):
+            plan.append(
+                {
+                    "shard": k,
+                    "trip_offset": trip_offset,
+                    "n_trips": n,
+                    "delivery_offset": delivery_offset,
+                    "target": t,
+                }
+            )
+            trip_offset += n
+            delivery_offset += t
+        return plan
+
+    def generate_shard(
+        self,
+        shard: int,
+        trip_offset: int,
+        n_trips: int,
+        delivery_offset: int,
+        target: int,
+        total_trips: int,
+        catalogs: tuple,
+        start_date: datetime,
+        now: datetime,
+        year: int,
+        seed: int = SEED,
+        quality_refs: dict | None = None,
+    ) -> dict:
+        """
+        Genera e inserta un shard completo: trips [trip_offset, trip_offset+n)
+        y sus deliveries, con ids explícitos y semilla propia del shard.
+        Las deliveries salen de los arrays del shard (sin releer la DB).
+        'quality_refs' trae las referencias del proceso padre para validar en
+        memoria (el worker no tiene las maestras en su grafo).
+        """
+        if quality_refs is not None:
+            self._quality_refs = quality_refs
+        rng = self._start_shard(seed, shard)
+        cols, trip_id = self._shard_trips(
+            rng, trip_offset, n_trips, total_trips, catalogs, start_date, now
+        )
+        vehicles = catalogs[0]
+
+        per_trip = self._sample_delivery_counts(rng, n_trips)
+        self._fit_delivery_counts(per_trip, target)
+
+        arrival = np.where(
+            cols["completed"], cols["arrival_datetime"], np.datetime64("NaT")
+        )
+        deliveries = self._delivery_columns(
+            rng,
+            trip_id,
+            cols["departure_datetime"],
+            arrival,
+            cols["total_weight_kg"],
+            cols["destination_city"],
+            per_trip,
+            delivery_offset,
+            year,
+        )
+        self._validate_deliveries_in_memory(deliveries, trip_id, delivery_offset + 1)
+        self._load(
+            "deliveries",
+            ("delivery_id",) + DELIVERY_COLUMNS,
+            self._delivery_rows(deliveries, first_delivery_id=delivery_offset + 1),
+            commit_every=self._bulk_commit_every,
+            partition=deliveries["trip_departure"],
+        )
+        return {
+            "shard": shard,
+            "trips": n_trips,
+            "deliveries": target,
+            "load_stats": self.load_stats,
+            "quality": self.quality,
+            "vehicle_usage": self._vehicle_usage(
+                cols, int(vehicles["vehicle_id"].max()) + 1
+            ),
+        }
+
+    def generate_trips_and_deliveries_parallel(
+        self,
+        trips: int = 100_000,
+        deliveries: int = 400_000,
+        workers: int | None = None,
+        shard_size: int = 250_000,
+    ):
+        """
+        Reparte trips+deliveries en shards sobre un Pool de multiprocessing;
+        cada worker usa su propia conexión PostgreSQL. Con workers=0 los
+        shards corren uno tras otro en este proceso (memoria acotada por
+        shard_size). El resultado es idéntico con cualquier número de workers,
+        incluido 0, porque los shards, sus semillas y sus rangos de ids solo
+        dependen de shard_size.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        logging.info(
+            f"Generando {trips} trips y {deliveries} deliveries por shards "
+            f"(workers={workers or 'secuencial'}, shard_size={shard_size})…"
+        )
+        catalogs = self._load_trip_catalogs()
+        now = datetime.now()
+        base = {
+            "total_trips": trips,
+            "catalogs": catalogs,
+            "start_date": now - timedelta(days=730),  # ~2 años
+            "now": now,
+            "year": now.year,
+            "seed": self.seed,
+            "quality_refs": self.quality_refs if self.validate == "memory" else None,
+        }
+        self._ensure_identity_pool()  # publica el cache antes de lanzar workers
+        gen_kwargs = {
+            "loader": self.loader,
+            "commit_every": self.commit_every,
+            "identity_pool_size": self.identity_pool_size,
+            "output": self.output,
+            "output_dir": self.output_dir,
+            "validate": self.validate,
+            "seed": self.seed,  # mismo pool de identidades que este proceso
+        }
+        tasks = [
+            (self.db_conf, gen_kwargs, {**base, **shard})
+            for shard in self._plan_shards(trips, deliveries, shard_size)
+        ]
+
+        t0 = time.perf_counter()
+        with ExitStack() as stack:
+            if workers == 0:
+                stack.enter_context(self._in_process_shards())
+                results = (self.generate_shard(**task) for _db, _kw, task in tasks)
+            else:
+                pool = stack.enter_context(
+                    multiprocessing.Pool(processes=min(workers, len(tasks)))
+                )
+                results = pool.imap_unordered(_run_shard, tasks)
+            for res in results:
+                self._add_vehicle_usage(res["vehicle_usage"])
+                if workers:  # en este proceso las stats ya quedaron en self
+                    self._merge_shard_stats(res)
+                logging.info(
+                    f"  shard {res['shard']}: {res['trips']:,} trips, "
+                    f"{res['deliveries']:,} deliveries"
+                )
+        elapsed = time.perf_counter() - t0
+
+        # secuencias SERIAL al día tras insertar ids explícitos
+        self._sync_sequence("trips", "trip_id", trips)
+        self._sync_sequence("deliveries", "delivery_id", deliveries)
+
+        for table in ("trips", "deliveries"):
+            st = self.load_stats[table]
+            st["rows_per_sec"] = round(st["rows"] / elapsed, 1) if elapsed else None
+        self.counters["trips"] = trips
+        self.counters["deliveries"] = deliveries
+        logging.info(
+            f"✔ {trips} trips y {deliveries} deliveries insertados en {elapsed:.2f}s "
+            f"({len(tasks)} shards)."
+        )
+
+    # ---------------- Modo continuo (append) ----------------
+    def _live_state(self) -> dict:
+        """
+        Estado inicial del modo continuo leído de la DB: próximos ids, trips
+        'in_progress' con una llegada planificada (duración estimada de la ruta
+        con ruido) y entregas 'pending' con su hora de entrega prevista.
+        """
+        self.cur.execute("SELECT COALESCE(MAX(trip_id), 0) FROM trips")
+        last_trip = self.cur.fetchone()[0]
+        self.cur.execute("SELECT COALESCE(MAX(delivery_id), 0) FROM deliveries")
+        last_delivery = self.cur.fetchone()[0]
+
+        self.cur.execute("""
+            SELECT t.trip_id, t.departure_datetime, r.distance_km, r.estimated_duration_hours
+            FROM trips t
+            JOIN routes r ON r.route_id = t.route_id
+            WHERE t.status = 'in_progress'
+        """)
+        open_trips = self.cur.fetchall()
+        trip_id = np.array([r[0] for r in open_trips], dtype=np.int64)
+        departure = np.array([r[1] for r in open_trips], dtype="datetime64[us]")
+        distance = np.array([float(r[2]) for r in open_trips])
+        est = np.array([float(r[3]) for r in open_trips])
+        hours = np.maximum(est, distance / 70.0 + 1.0) * self.rng.uniform(
+            0.85, 1.15, size=len(open_trips)
+        )
+        arrival = departure + np.round(hours * 3_600_000_000).astype("timedelta64[us]")
+
+        self.cur.execute(
+            "SELECT delivery_id, scheduled_datetime FROM deliveries "
+            "WHERE delivery_status = 'pending'"
+        )
+        pending = self.cur.fetchall()
+        scheduled = np.array([r[1] for r in pending], dtype="datetime64[us]")
+        self.conn.commit()
+
+        logging.info(
+            f"🔄 Estado inicial: {len(trip_id):,} trips en curso, "
+            f"{len(pending):,} entregas pendientes"
+        )
+        return {
+            "last_trip_id": last_trip,
+            "last_delivery_id": last_delivery,
+            "open_trip_id": trip_id,
+            "open_arrival": arrival,
+            "pending_id": np.array([r[0] for r in pending], dtype=np.int64),
+            "pending_due": scheduled
+            + self._sample_delivery_delays(self.rng, len(pending)),
+            "pending_signature": self.rng.random(len(pending)) < 0.95,
+        }
+
+    def _live_insert(self, state: dict, catalogs: tuple, t0, t1, n_new: int):
         """
-        execute_batch(self.cur, q, rows[:target], page_size=500)
+        Inserta 'n_new' trips con salida en [t0, t1) como 'in_progress' y sus
+        entregas como 'pending'. La llegada y las horas de entrega se simulan
+        ya aquí y quedan en 'state' hasta que el reloj simulado las alcance.
+        """
+        vehicles, drivers, routes = catalogs
+        # salida uniforme dentro del tick; llegada y estado salen de ella (con
+        # now = t0 ningún trip nuevo figura completado)
+        window = int((t1 - t0) / np.timedelta64(1, "us"))
+        offsets = np.sort(self.rng.integers(0, max(window, 1), size=n_new))
+        departure = (t0 + offsets.astype("timedelta64[us]")).astype("datetime64[us]")
+        cols = self._build_trip_columns(
+            self.rng,
+            n_new,
+            vehicles,
+            drivers,
+            routes,
+            t0.astype(datetime),
+            t0.astype(datetime),
+            departure=departure,
+        )
+        arrival = cols["arrival_datetime"]
+
+        first_trip = state["last_trip_id"] + 1
+        self._load(
+            "trips",
+            ("trip_id",) + TRIP_COLUMNS,
+            self._trip_rows(cols, first_trip_id=first_trip),
+            verbose=False,
+        )
+        trip_id = np.arange(first_trip, first_trip + n_new, dtype=np.int64)
+        state["last_trip_id"] += n_new
+        self._sync_sequence("trips", "trip_id", state["last_trip_id"])
+
+        dcols = self._delivery_columns(
+            self.rng,
+            trip_id,
+            departure,
+            arrival,
+            cols["total_weight_kg"],
+            cols["destination_city"],
+            self._sample_delivery_counts(self.rng, n_new),
+            state["last_delivery_id"],
+            year=t0.astype(datetime).year,
+        )
+        n_deliveries = len(dcols["trip_id"])
+        first_delivery = state["last_delivery_id"] + 1
+        due, signature = dcols["delivered_datetime"], dcols["recipient_signature"]
+        dcols["delivered_datetime"] = np.full(n_deliveries, np.datetime64("NaT", "us"))
+        dcols["delivery_status"] = np.full(n_deliveries, "pending")
+        dcols["recipient_signature"] = np.zeros(n_deliveries, dtype=bool)
+        self._load(
+            "deliveries",
+            ("delivery_id",) + DELIVERY_COLUMNS,
+            self._delivery_rows(dcols, first_delivery_id=first_delivery),
+            verbose=False,
+        )
+        state["last_delivery_id"] += n_deliveries
+        self._sync_sequence("deliveries", "delivery_id", state["last_delivery_id"])
+
+        state["open_trip_id"] = np.concatenate((state["open_trip_id"], trip_id))
+        state["open_arrival"] = np.concatenate((state["open_arrival"], arrival))
+        state["pending_id"] = np.concatenate(
+            (
+                state["pending_id"],
+                np.arange(
+                    first_delivery, first_delivery + n_deliveries, dtype=np.int64
+                ),
+            )
+        )
+        state["pending_due"] = np.concatenate((state["pending_due"], due))
+        state["pending_signature"] = np.concatenate(
+            (state["pending_signature"], signature)
+        )
+        self.counters["trips"] += n_new
+        self.counters["deliveries"] += n_deliveries
+        return n_deliveries
+
+    def _live_advance(self, state: dict, now) -> tuple:
+        """
+        Avanza el reloj simulado hasta 'now': marca 'delivered' (con
+        delivered_datetime y firma) las entregas vencidas y 'completed' (con
+        arrival_datetime) los trips cuya llegada ya pasó. UPDATE set-based.
+        """
+        done = state["pending_due"] <= now
+        n_delivered = int(done.sum())
+        if n_delivered:
+            execute_values(
+                self.cur,
+                """
+                UPDATE deliveries d
+                SET delivered_datetime = v.delivered,
+                    delivery_status = 'delivered',
+                    recipient_signature = v.signature
+                FROM (VALUES %s) AS v(delivery_id, delivered, signature)
+                WHERE d.delivery_id = v.delivery_id
+                """,
+                list(
+                    zip(
+                        state["pending_id"][done].tolist(),
+                        state["pending_due"][done].tolist(),
+                        state["pending_signature"][done].tolist(),
+                    )
+                ),
+                page_size=1000,
+            )
+            for key in ("pending_id", "pending_due", "pending_signature"):
+                state[key] = state[key][~done]
+
+        arrived = state["open_arrival"] <= now
+        n_completed = int(arrived.sum())
+        if n_completed:
+            execute_values(
+                self.cur,
+                """
+                UPDATE trips t
+                SET arrival_datetime = v.arrival,
+                    status = 'completed'
+                FROM (VALUES %s) AS v(trip_id, arrival)
+                WHERE t.trip_id = v.trip_id
+                """,
+                list(
+                    zip(
+                        state["open_trip_id"][arrived].tolist(),
+                        state["open_arrival"][arrived].tolist(),
+                    )
+                ),
+                page_size=1000,
+            )
+            for key in ("open_trip_id", "open_arrival"):
+                state[key] = state[key][~arrived]
         self.conn.commit()
-        self.counters["maintenance"] = min(len(rows), target)
+        return n_completed, n_delivered
+
+    def run_live(
+        self,
+        rate: float,
+        duration: float | None = None,
+        time_scale: float = 60.0,
+        tick: float = 1.0,
+    ) -> dict:
+        """
+        Modo continuo (append): simula actividad de flota en vivo sobre la DB
+        existente, sin TRUNCATE.
+        - 'rate' = trips nuevos por segundo real en promedio diario; la tasa
+          instantánea sigue el perfil horario (_hourly_distribution_full_24) de
+          la hora simulada, así que de 23 a 06 no salen trips.
+        - El reloj simulado arranca en 'ahora' y avanza 'time_scale' segundos
+          por segundo real; cada tick inserta trips/entregas nuevos, completa
+          trips y llena delivered_datetime a medida que se alcanzan.
+        - Corre 'duration' segundos o hasta Ctrl+C.
+        """
+        if self.sink:
+            raise ValueError(
+                "El modo continuo escribe en PostgreSQL (--output postgres)."
+            )
+        catalogs = self._load_trip_catalogs()
+        state = self._live_state()
+        hourly = self._hourly_distribution_full_24() * 24  # media diaria = 1
+        step = np.timedelta64(int(tick * time_scale * 1_000_000), "us")
+        sim = np.datetime64(datetime.now(), "us")
+
+        totals = dict.fromkeys(
+            ("ticks", "late_ticks", "trips", "deliveries", "trips_completed"), 0
+        )
+        totals["deliveries_delivered"] = 0
+        log_every = max(1, round(10 / tick))
         logging.info(
-            f"✔ {self.counters['maintenance']} maintenance insertados (objetivo: {target})."
+            f"▶ Modo continuo: {rate} trips/s, x{time_scale} tiempo simulado, "
+            f"tick {tick}s" + (f", {duration}s" if duration else ", hasta Ctrl+C")
+        )
+        start = deadline = time.perf_counter()
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                nxt = sim + step
+                hour = sim.astype(datetime).hour
+                n_new = int(self.rng.poisson(rate * tick * hourly[hour]))
+                if n_new:
+                    totals["deliveries"] += self._live_insert(
+                        state, catalogs, sim, nxt, n_new
+                    )
+                    totals["trips"] += n_new
+                completed, delivered = self._live_advance(state, nxt)
+                totals["trips_completed"] += completed
+                totals["deliveries_delivered"] += delivered
+                sim = nxt
+                totals["ticks"] += 1
+
+                if totals["ticks"] % log_every == 0:
+                    logging.info(
+                        f"⏩ {sim.astype(datetime):%Y-%m-%d %H:%M} | "
+                        f"+{totals['trips']:,} trips, +{totals['deliveries']:,} entregas, "
+                        f"{totals['trips_completed']:,} completados, "
+                        f"{totals['deliveries_delivered']:,} entregados | "
+                        f"en curso {len(state['open_trip_id']):,}"
+                    )
+                deadline += tick
+                wait = deadline - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    totals["late_ticks"] += 1  # la DB no sostiene la tasa pedida
+        except KeyboardInterrupt:
+            logging.info("⏹ Modo continuo detenido.")
+            self.conn.rollback()
+
+        elapsed = time.perf_counter() - start
+        totals["seconds"] = round(elapsed, 1)
+        totals["events_per_sec"] = (
+            round(
+                (
+                    totals["trips"]
+                    + totals["deliveries"]
+                    + totals["trips_completed"]
+                    + totals["deliveries_delivered"]
+                )
+                / elapsed,
+                1,
+            )
+            if elapsed
+            else None
         )
+        if totals["late_ticks"]:
+            logging.warning(
+                f"⚠️ {totals['late_ticks']} de {totals['ticks']} ticks fuera de plazo."
+            )
+        logging.info(f"✔ Modo continuo: {totals}")
+        return totals
 
     # ---------------- QA & Resumen ----------------
-    def validate_data_quality(self) -> bool:
-        logging.info("🔍 Validando calidad de datos…")
-        validations = {
-            "Trips sin vehículo válido": """
-                SELECT COUNT(*) FROM trips t
-                LEFT JOIN vehicles v ON v.vehicle_id = t.vehicle_id
-                WHERE v.vehicle_id IS NULL
-            """,
-            "Deliveries sin trip válido": """
-                SELECT COUNT(*) FROM deliveries d
-                LEFT JOIN trips t ON t.trip_id = d.trip_id
-                WHERE t.trip_id IS NULL
-            """,
-            "arrival <= departure": """
-                SELECT COUNT(*) FROM trips
-                WHERE arrival_datetime IS NOT NULL
-                  AND arrival_datetime <= departure_datetime
-            """,
-            "Peso excede capacidad": """
-                SELECT COUNT(*) FROM trips t
-                JOIN vehicles v ON v.vehicle_id = t.vehicle_id
-                WHERE t.total_weight_kg > v.capacity_kg
-            """,
-            "Licencia vencida vs fecha viaje": """
-                SELECT COUNT(*) FROM trips t
-                JOIN drivers d ON d.driver_id = t.driver_id
-                WHERE d.license_expiry IS NOT NULL
-                  AND t.departure_datetime::date > d.license_expiry
-            """,
-            "Entregas sin tracking": """
-                SELECT COUNT(*) FROM deliveries
-                WHERE tracking_number IS NULL OR tracking_number = ''
-            """,
+    @property
+    def quality_refs(self) -> dict:
+        """
+        Referencias para validar en memoria, indexadas por id: capacidad por
+        vehicle_id (NaN = no existe) y vencimiento de licencia por driver_id.
+        Salen del grafo; sin maestras en el grafo, esos checks se omiten.
+        """
+        if self._quality_refs is None:
+            refs = {}
+            v = self.graph.get("vehicles")
+            if v is not None:
+                cap = np.full(int(v["vehicle_id"].max()) + 1, np.nan)
+                cap[v["vehicle_id"]] = v["capacity_kg"]
+                refs["capacity_kg"] = cap
+            d = self.graph.get("drivers")
+            if d is not None:
+                expiry = np.full(
+                    int(d["driver_id"].max()) + 1, np.datetime64("NaT"), "datetime64[D]"
+                )
+                expiry[d["driver_id"]] = d["license_expiry"]
+                refs["license_expiry"] = expiry
+            self._quality_refs = refs
+        return self._quality_refs
+
+    def _record_checks(self, checks: dict, keys: np.ndarray):
+        """
+        Ejecuta checks en memoria (nombre -> función que devuelve la máscara de
+        violaciones) y acumula conteo, muestra de claves y tiempo por check.
+        """
+        for name, check in checks.items():
+            t0 = time.perf_counter()
+            mask = check()
+            elapsed = time.perf_counter() - t0
+            self._merge_quality(
+                {
+                    name: {
+                        "source": "memory",
+                        "violations": int(mask.sum()),
+                        "sample": keys[mask][:QUALITY_SAMPLE_SIZE].tolist(),
+                        "seconds": elapsed,
+                    }
+                }
+            )
+
+    def _merge_shard_stats(self, res: dict):
+        """Acumula calidad y estadísticas de carga de un shard de otro proceso."""
+        self._merge_quality(res["quality"])
+        for table, st in res["load_stats"].items():
+            agg = self.load_stats.setdefault(
+                table,
+                {
+                    "loader": st["loader"],
+                    "rows": 0,
+                    "seconds": 0.0,
+                    "bytes": None if st["bytes"] is None else 0,
+                },
+            )
+            agg["rows"] += st["rows"]
+            if st["bytes"]:
+                agg["bytes"] += st["bytes"]
+            agg["seconds"] = round(agg["seconds"] + st["seconds"], 4)
+
+    def _merge_quality(self, report: dict):
+        """Acumula un reporte de calidad (p. ej. de un shard) en self.quality."""
+        for name, r in report.items():
+            acc = self.quality.setdefault(
+                name,
+                {"source": r["source"], "violations": 0, "sample": [], "seconds": 0.0},
+            )
+            acc["violations"] += r["violations"]
+            # menores claves primero: la muestra no depende del orden de los shards
+            acc["sample"] = sorted(acc["sample"] + r["sample"])[:QUALITY_SAMPLE_SIZE]
+            acc["seconds"] = round(acc["seconds"] + r["seconds"], 4)
+
+    def _validate_trips_in_memory(self, cols: dict, trip_id: np.ndarray):
+        """Checks de trips sobre las columnas del motor, antes de escribirlas."""
+        if self.validate != "memory":
+            return
+        refs = self.quality_refs
+        checks = {
+            "arrival <= departure": lambda: (
+                cols["completed"]
+                & (cols["arrival_datetime"] <= cols["departure_datetime"])
+            )
         }
+        if "capacity_kg" in refs:
+            cap = refs["capacity_kg"]
+            vid = cols["vehicle_id"]
+            capacity = np.where(
+                vid < len(cap), cap[np.minimum(vid, len(cap) - 1)], np.nan
+            )
+            checks["Trips sin vehículo válido"] = lambda: np.isnan(capacity)
+            checks["Peso excede capacidad"] = lambda: cols["total_weight_kg"] > capacity
+        if "license_expiry" in refs:
+            exp = refs["license_expiry"]
+            did = cols["driver_id"]
+            checks["Licencia vencida vs fecha viaje"] = lambda: (
+                cols["departure_datetime"].astype("datetime64[D]")
+                > np.where(
+                    did < len(exp),
+                    exp[np.minimum(did, len(exp) - 1)],
+                    np.datetime64("NaT"),
+                )
+            )
+        self._record_checks(checks, trip_id)
+
+    def _validate_deliveries_in_memory(
+        self, cols: dict, trip_id: np.ndarray, first_delivery_id: int
+    ):
+        """Checks de un bloque de deliveries contra los trips que lo originan."""
+        if self.validate != "memory":
+            return
+        n = len(cols["trip_id"])
+        self._record_checks(
+            {
+                "Deliveries sin trip válido": lambda: (
+                    ~np.isin(cols["trip_id"], trip_id)
+                ),
+                "Entregas sin tracking": lambda: (
+                    np.char.str_len(cols["tracking_number"]) == 0
+                ),
+            },
+            np.arange(first_delivery_id, first_delivery_id + n, dtype=np.int64),
+        )
+
+    def _run_quality_scan(self, scan: str, names: list) -> dict:
+        """
+        Ejecuta los checks de un scan en su propia conexión: una sola consulta
+        con COUNT(*) FILTER por check y, solo para los que fallan, una muestra
+        de claves con LIMIT.
+        """
+        source = QUALITY_SCANS[scan]
+        aggs = ",\n".join(
+            f"COUNT(*) FILTER (WHERE {QUALITY_CHECKS[n][2]})" for n in names
+        )
+        conn = psycopg2.connect(**self.db_conf)
+        try:
+            cur = conn.cursor()
+            t0 = time.perf_counter()
+            cur.execute(f"SELECT {aggs} FROM {source}")
+            counts = cur.fetchone()
+            scan_seconds = time.perf_counter() - t0
+
+            report = {}
+            for name, violations in zip(names, counts):
+                _, key, predicate = QUALITY_CHECKS[name]
+                t1 = time.perf_counter()
+                sample = []
+                if violations:
+                    cur.execute(
+                        f"SELECT {key} FROM {source} WHERE {predicate} "
+                        f"ORDER BY {key} LIMIT %s",
+                        (QUALITY_SAMPLE_SIZE,),
+                    )
+                    sample = [r[0] for r in cur.fetchall()]
+                report[name] = {
+                    "source": "db",
+                    "scan": scan,
+                    "violations": violations,
+                    "sample": sample,
+                    "seconds": round(scan_seconds + time.perf_counter() - t1, 4),
+                }
+            return report
+        finally:
+            conn.close()
+
+    def validate_data_quality(self, workers: int | None = None) -> bool | None:
+        """
+        Valida la calidad de los datos según self.validate:
+        - db: los checks se agrupan por scan (trips, deliveries) y cada scan
+          corre en paralelo en su propia conexión (pool de 'workers' hilos).
+        - memory: reporta lo acumulado durante la generación (antes de escribir).
+        - off: no valida (None).
+        Deja violaciones, muestra de claves y tiempo por check en self.quality.
+        """
+        if self.validate == "off":
+            return None
+        logging.info(f"🔍 Validando calidad de datos ({self.validate})…")
+        if self.validate == "db":
+            scans = {}
+            for name, (scan, *_rest) in QUALITY_CHECKS.items():
+                scans.setdefault(scan, []).append(name)
+            with ThreadPoolExecutor(max_workers=workers or len(scans)) as ex:
+                for report in ex.map(
+                    lambda item: self._run_quality_scan(*item), scans.items()
+                ):
+                    self.quality.update(report)
+
         ok = True
-        for desc, sql in validations.items():
-            self.cur.execute(sql)
-            c = self.cur.fetchone()[0]
-            if c > 0:
-                logging.warning(f"⚠ {desc}: {c} registros")
+        for name in QUALITY_CHECKS:
+            r = self.quality.get(name)
+            if r is None:
+                continue
+            if r["violations"] > 0:
+                logging.warning(
+                    f"⚠ {name}: {r['violations']} registros (p. ej. {r['sample']})"
+                )
                 ok = False
             else:
-                logging.info(f"✔ {desc}: OK")
+                logging.info(f"✔ {name}: OK ({r['seconds']:.3f}s)")
         return ok
 
-    def summary(self):
+    def summary(self, path: str = "generation_summary.json"):
         logging.info("📊 Resumen de tablas:")
         total = 0
-        for t in [
-            "vehicles",
-            "drivers",
-            "routes",
-            "trips",
-            "deliveries",
-            "maintenance",
-        ]:
-            self.cur.execute(f"SELECT COUNT(*) FROM {t}")
-            c = self.cur.fetchone()[0]
+        for t in TABLES:
+            if self.sink:
+                c = self.counters[t]
+            else:
+                self.cur.execute(f"SELECT COUNT(*) FROM {t}")
+                c = self.cur.fetchone()[0]
             logging.info(f"  - {t}: {c:,}")
             total += c
         logging.info(f"TOTAL filas: {total:,}")
@@ -738,38 +2546,242 @@ class DataGenerator:
         valid = self.validate_data_quality()
         summary = {
             "generation_date": datetime.now().isoformat(),
+            "run_config": self.run_config,
+            "output": self.output,
             "table_counts": self.counters,
+            "load_stats": self.load_stats,
+            "stage_metrics": self.stage_metrics,
+            "live_stats": self.live_stats,
+            "identity_pool_size": self.identity_pool_size,
             "validations_passed": valid,
+            "quality_checks": self.quality,
+            "index_rebuild": self.index_rebuild,
         }
-        with open("generation_summary.json", "w", encoding="utf-8") as f:
+        with open(path, "w", encoding="utf-8") as f:
             json.dump(summary, f, indent=2, ensure_ascii=False)
-        logging.info("📝 Resumen guardado en generation_summary.json")
+        logging.info(f"📝 Resumen guardado en {path}")
+
+
+def _run_shard(task: tuple) -> dict:
+    """Worker del Pool: abre su propia conexión y genera un shard."""
+    db_conf, gen_kwargs, shard = task
+    gen = DataGenerator(db_conf, **gen_kwargs)  # generate_shard fija el prefijo
+    gen.connect()
+    try:
+        return gen.generate_shard(**shard)
+    except Exception:
+        if gen.conn:
+            gen.conn.rollback()
+        raise
+    finally:
+        gen.close()
 
 
 # --------------------------------------------------------------------------------------
 # main
 # --------------------------------------------------------------------------------------
-def main():
+def scaled_counts(scale_factor: float) -> dict:
+    """Volúmenes por tabla para un scale factor (estilo TPC, SF 1 = base)."""
+    counts = {t: max(1, round(n * scale_factor)) for t, n in BASE_COUNTS.items()}
+    counts["routes"] = min(counts["routes"], MAX_ROUTES)
+    # al menos 2 entregas por trip
+    counts["deliveries"] = max(counts["deliveries"], 2 * counts["trips"])
+    return counts
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(
+        description="FleetLogix – generador de datos sintéticos (Avance 1)"
+    )
+    ap.add_argument(
+        "--scale-factor",
+        type=float,
+        default=float(os.getenv("GEN_SCALE_FACTOR", "1")),
+        help="Escala todos los volúmenes (SF 1 = 100k trips / 400k deliveries)",
+    )
+    ap.add_argument(
+        "--stages",
+        default=",".join(TABLES),
+        help=(
+            f"Etapas a ejecutar, separadas por coma ({','.join(TABLES)}). "
+            "Con 'deliveries' sin 'trips' las entregas se generan sobre los trips "
+            "existentes con el generador de la corrida (--seed), no con el de cada "
+            "shard: difieren de las de una corrida trips,deliveries"
+        ),
+    )
+    ap.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(os.getenv("GEN_COMMIT_EVERY", "0")) or None,
+        help="Filas por lote/commit (por defecto según loader)",
+    )
+    ap.add_argument(
+        "--loader", choices=LOADER_MODES, default=os.getenv("GEN_LOADER", "batch")
+    )
+    ap.add_argument(
+        "--output", choices=OUTPUT_MODES, default=os.getenv("GEN_OUTPUT", "postgres")
+    )
+    ap.add_argument("--output-dir", default=RAW_DIR)
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("GEN_WORKERS", "0")),
+        help="Procesos para trips+deliveries (0 = shards en este proceso)",
+    )
+    ap.add_argument("--shard-size", type=int, default=250_000)
+    ap.add_argument("--chunk-size", type=int, default=50_000)
+    ap.add_argument(
+        "--identity-pool",
+        type=int,
+        default=int(os.getenv("GEN_IDENTITY_POOL", "50000")),
+        help="Tamaño del pool de identidades (cardinalidad de clientes)",
+    )
+    ap.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="Borra índices/UNIQUE/FK antes de cargar y los reconstruye en paralelo",
+    )
+    ap.add_argument(
+        "--validate",
+        choices=VALIDATION_MODES,
+        default=None,
+        help="Validación de calidad (defecto: db con PostgreSQL, memory con archivos)",
+    )
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument(
+        "--summary-path",
+        default="generation_summary.json",
+        help="Archivo JSON de resumen/benchmark",
+    )
+    live = ap.add_argument_group("modo continuo (append)")
+    live.add_argument(
+        "--append",
+        action="store_true",
+        help="Simula actividad en vivo sobre la DB existente (sin TRUNCATE)",
+    )
+    live.add_argument(
+        "--rate",
+        type=float,
+        default=5.0,
+        help="Trips nuevos por segundo (promedio diario, sigue el perfil horario)",
+    )
+    live.add_argument(
+        "--duration", type=float, default=None, help="Segundos (defecto: hasta Ctrl+C)"
+    )
+    live.add_argument(
+        "--time-scale",
+        type=float,
+        default=60.0,
+        help="Segundos simulados por segundo real",
+    )
+    live.add_argument("--tick", type=float, default=1.0, help="Segundos por tick")
+    args = ap.parse_args(argv)
+    if args.append and args.output != "postgres":
+        ap.error("--append requiere --output postgres")
+    if args.defer_indexes and (args.output != "postgres" or args.append):
+        ap.error("--defer-indexes aplica a la carga masiva en PostgreSQL")
+    args.stages = [t.strip() for t in args.stages.split(",") if t.strip()]
+    unknown = set(args.stages) - set(TABLES)
+    if unknown:
+        ap.error(f"Etapas desconocidas: {sorted(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    counts = scaled_counts(args.scale_factor)
+    stages = [t for t in TABLES if t in args.stages]
     logging.info("FLEETLOGIX – Avance 1 (COMPLETO)")
-    gen = DataGenerator(DB_CONFIG)
+    logging.info(f"Scale factor {args.scale_factor}: {counts} | etapas: {stages}")
+
+    random.seed(args.seed)
+    Faker.seed(args.seed)
+    gen = DataGenerator(
+        DB_CONFIG,
+        seed=args.seed,
+        loader=args.loader,
+        commit_every=args.batch_size,
+        identity_pool_size=args.identity_pool,
+        output=args.output,
+        output_dir=args.output_dir,
+        validate=args.validate,
+    )
+    gen.run_config = {
+        "scale_factor": args.scale_factor,
+        "stages": stages,
+        "counts": {t: counts[t] for t in stages},
+        "loader": args.loader,
+        "output": args.output,
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "defer_indexes": args.defer_indexes,
+        "seed": args.seed,
+    }
     try:
         gen.connect()
-        gen.truncate_all()
-
-        gen.generate_vehicles(200)
-        gen.generate_drivers(400)
-        gen.generate_routes(50)
+        if args.append:
+            gen.run_config = {
+                "mode": "append",
+                "rate": args.rate,
+                "duration": args.duration,
+                "time_scale": args.time_scale,
+                "tick": args.tick,
+                "loader": args.loader,
+                "seed": args.seed,
+            }
+            with gen.stage("live", ("trips", "deliveries")):
+                gen.live_stats = gen.run_live(
+                    args.rate, args.duration, args.time_scale, args.tick
+                )
+            gen.summary(args.summary_path)
+            return
 
-        gen.generate_trips(100_000)
-        gen.generate_deliveries(400_000)
-        gen.generate_maintenance(5_000)
+        gen.truncate_all(tuple(stages))
+        if args.defer_indexes:
+            gen.defer_indexes(tuple(stages))
 
-        gen.summary()
+        for table, method in (
+            ("vehicles", gen.generate_vehicles),
+            ("drivers", gen.generate_drivers),
+            ("routes", gen.generate_routes),
+        ):
+            if table in stages:
+                with gen.stage(table, (table,)):
+                    method(counts[table])
+
+        if {"trips", "deliveries"} <= set(stages):
+            with gen.stage("trips+deliveries", ("trips", "deliveries")):
+                gen.generate_trips_and_deliveries_parallel(
+                    counts["trips"], counts["deliveries"], args.workers, args.shard_size
+                )
+        else:
+            if "trips" in stages:
+                with gen.stage("trips", ("trips",)):
+                    gen.generate_trips(counts["trips"], args.shard_size)
+            if "deliveries" in stages:
+                with gen.stage("deliveries", ("deliveries",)):
+                    gen.generate_deliveries(counts["deliveries"], args.chunk_size)
+        if "maintenance" in stages:
+            with gen.stage("maintenance", ("maintenance",)):
+                gen.generate_maintenance(counts["maintenance"])
+        if gen.deferred:
+            with gen.stage("rebuild_indexes", ()):
+                gen.rebuild_indexes(args.workers or None)
+
+        gen.summary(args.summary_path)
         logging.info(f"✔ Counters: {gen.counters}")
     except Exception:
         logging.exception("❌ Fallo durante la generación; se aplicará rollback.")
         if gen.conn:
             gen.conn.rollback()
+        if gen.deferred:
+            try:
+                gen.rebuild_indexes(args.workers or None)
+            except Exception:
+                logging.exception(
+                    f"❌ No se pudieron reconstruir los índices; DDL en {DEFERRED_DDL_PATH}"
+                )
         raise
     finally:
         gen.close()
@@ -61,6 +61,7 @@ CREATE OR REPLACE TABLE dim_vehicle (
     age_months INT,
     status VARCHAR(20),
     last_maintenance_date DATE,
+    row_hash VARCHAR(32),         -- md5 de los atributos versionados (SCD2)
     valid_from DATE,
     valid_to DATE,
     is_current BOOLEAN
@@ -79,6 +80,7 @@ CREATE OR REPLACE TABLE dim_driver (
     experience_months INT,
     status VARCHAR(20),
     performance_category VARCHAR(20), -- 'Alto', 'Medio', 'Bajo'
+    row_hash VARCHAR(32),         -- md5 de los atributos versionados (SCD2)
     valid_from DATE,
     valid_to DATE,
     is_current BOOLEAN
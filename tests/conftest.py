@@ -0,0 +1,247 @@
+"""
+Fixtures compartidas. Los scripts (01_data_generation.py, 05_etl_pipeline.py)
+no son importables por nombre: se cargan desde su ruta. El origen PostgreSQL
+del ETL se simula con DuckDB detrás de una conexión estilo psycopg2.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import duckdb
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[1] / "scripts"
+
+
+def load_script(name: str, filename: str):
+    """Importa un script de scripts/ como módulo (una vez por sesión)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, SCRIPTS_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # pickle / multiprocessing lo resuelven por nombre
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def datagen():
+    return load_script("data_generation", "01_data_generation.py")
+
+
+@pytest.fixture(scope="session")
+def etl_module():
+    return load_script("etl_pipeline", "05_etl_pipeline.py")
+
+
+# --------------------------------------------------------------------------------------
+# Origen PostgreSQL simulado
+# --------------------------------------------------------------------------------------
+
+# DIMENSION_SOURCES sin AGE() ni ROW()::text, que DuckDB no tiene
+DUCKDB_DIMENSION_SOURCES = {
+    "dim_vehicle": """
+        SELECT v.vehicle_id, v.license_plate, v.vehicle_type, v.capacity_kg,
+               v.fuel_type, v.acquisition_date,
+               date_diff('month', v.acquisition_date, current_date)::int AS age_months,
+               v.status,
+               m.last_maintenance_date,
+               md5(concat_ws('|', v.license_plate, v.vehicle_type, v.capacity_kg,
+                             v.fuel_type, v.acquisition_date, v.status)) AS row_hash
+        FROM vehicles v
+        LEFT JOIN (
+            SELECT vehicle_id, MAX(maintenance_date) AS last_maintenance_date
+            FROM maintenance
+            GROUP BY vehicle_id
+        ) m ON m.vehicle_id = v.vehicle_id
+    """,
+    "dim_driver": """
+        SELECT driver_id, employee_code, first_name || ' ' || last_name AS full_name,
+               license_number, license_expiry, phone, hire_date,
+               date_diff('month', hire_date, current_date)::int AS experience_months,
+               status,
+               md5(concat_ws('|', employee_code, first_name, last_name, license_number,
+                             license_expiry, phone, hire_date, status)) AS row_hash
+        FROM drivers
+    """,
+    "dim_route": """
+        SELECT route_id, route_code, origin_city, destination_city, distance_km,
+               estimated_duration_hours, toll_cost,
+               CASE WHEN distance_km < 200 THEN 'Fácil'
+                    WHEN distance_km < 600 THEN 'Medio'
+                    ELSE 'Difícil' END AS difficulty_level,
+               CASE WHEN origin_city = destination_city THEN 'Urbana'
+                    ELSE 'Interurbana' END AS route_type
+        FROM routes
+    """,
+}
+
+# 300 trips de 4 entregas (1.200 filas) repartidas en 5 días de enero de 2024
+SOURCE_TABLES = [
+    """
+    CREATE TABLE vehicles AS
+    SELECT range + 1 AS vehicle_id, 'ABC' || (100 + range) AS license_plate,
+           'Van' AS vehicle_type, 1500.0 AS capacity_kg, 'Diésel' AS fuel_type,
+           DATE '2020-01-01' AS acquisition_date, 'active' AS status
+    FROM range(3)
+    """,
+    """
+    CREATE TABLE drivers AS
+    SELECT range + 1 AS driver_id, 'EMP' || range AS employee_code,
+           'Nombre' || range AS first_name, 'Apellido' AS last_name,
+           'LIC' || range AS license_number, DATE '2030-01-01' AS license_expiry,
+           '300' || range AS phone, DATE '2019-01-01' AS hire_date,
+           'active' AS status
+    FROM range(4)
+    """,
+    """
+    CREATE TABLE routes AS
+    SELECT range + 1 AS route_id, 'R' || range AS route_code,
+           'Bogotá' AS origin_city, 'Medellín' AS destination_city,
+           400.0 AS distance_km, 6.0 AS estimated_duration_hours,
+           20000.0 AS toll_cost
+    FROM range(5)
+    """,
+    """
+    CREATE TABLE maintenance AS
+    SELECT 1 AS maintenance_id, 1 AS vehicle_id, DATE '2023-12-01' AS maintenance_date
+    """,
+    """
+    CREATE TABLE trips AS
+    SELECT range + 1 AS trip_id, range % 3 + 1 AS vehicle_id,
+           range % 4 + 1 AS driver_id, range % 5 + 1 AS route_id,
+           TIMESTAMP '2024-01-01 06:00' + INTERVAL (range * 20) MINUTE
+               AS departure_datetime,
+           TIMESTAMP '2024-01-01 12:00' + INTERVAL (range * 20) MINUTE
+               AS arrival_datetime,
+           80.0 AS fuel_consumed_liters
+    FROM range(300)
+    """,
+    """
+    CREATE TABLE deliveries AS
+    SELECT range + 1 AS delivery_id, range // 4 + 1 AS trip_id,
+           'FL' || range AS tracking_number, 'Cliente ' || (range % 50) AS customer_name,
+           2.5 AS package_weight_kg, 'delivered' AS delivery_status,
+           TIMESTAMP '2024-01-01 07:00' + INTERVAL (range * 6) MINUTE
+               AS scheduled_datetime,
+           TIMESTAMP '2024-01-01 07:00' + INTERVAL (range * 6 + range % 45) MINUTE
+               AS delivered_datetime,
+           true AS recipient_signature
+    FROM range(1200)
+    """,
+]
+
+
+class FakePgCursor:
+    """Cursor psycopg2 mínimo sobre DuckDB (el SQL del ETL es compatible)"""
+
+    def __init__(self, db):
+        self.cursor = db.cursor()
+        self.description = None
+        self.rows = []
+        self.itersize = 0
+
+    def execute(self, sql: str, params=None):
+        if "pg_export_snapshot" in sql:
+            self.rows = [("snapshot",)]
+        elif sql.startswith("SET TRANSACTION"):
+            self.rows = []
+        elif "pg_stats" in sql:
+            self.rows = [(None,)]  # sin estadísticas: rangos por MIN/MAX
+        else:
+            sql = sql.replace("%s", "?").strip().rstrip(";")
+            self.cursor.execute(sql, list(params) if params else None)
+            self.description = self.cursor.description
+            self.rows = self.cursor.fetchall()
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size: int):
+        out, self.rows = self.rows[:size], self.rows[size:]
+        return out
+
+    def fetchall(self):
+        out, self.rows = self.rows, []
+        return out
+
+    def close(self):
+        self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakePgConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, name=None):
+        return FakePgCursor(self.db)
+
+    def set_session(self, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnectionPool:
+    def __init__(self, db):
+        self.db = db
+
+    def getconn(self):
+        return FakePgConnection(self.db)
+
+    def putconn(self, conn):
+        pass
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def source_db():
+    db = duckdb.connect()
+    for ddl in SOURCE_TABLES:
+        db.execute(ddl)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def dw_path(tmp_path):
+    return str(tmp_path / "fleetlogix.duckdb")
+
+
+@pytest.fixture
+def etl(etl_module, source_db, dw_path, tmp_path, monkeypatch):
+    """
+    Módulo ETL con PostgreSQL simulado y el warehouse DuckDB en tmp_path
+    (watermark, stage, checkpoints y métricas también quedan ahí).
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        etl_module.psycopg2, "connect", lambda **kw: FakePgConnection(source_db)
+    )
+    monkeypatch.setattr(
+        etl_module.pg_pool,
+        "ThreadedConnectionPool",
+        lambda *args, **kw: FakeConnectionPool(source_db),
+    )
+    for table, sql in DUCKDB_DIMENSION_SOURCES.items():
+        monkeypatch.setitem(etl_module.DIMENSION_SOURCES, table, sql)
+    monkeypatch.setitem(
+        etl_module.WAREHOUSES, "duckdb", lambda: etl_module.DuckDBWarehouse(dw_path)
+    )
+    return etl_module
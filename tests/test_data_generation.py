@@ -0,0 +1,129 @@
+import gzip
+import re
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("target", [300, 400, 517, 600])
+def test_fit_delivery_counts_hits_target_within_bounds(datagen, target):
+    per_trip = np.tile(np.array([2, 3, 4, 5, 6], dtype=np.int32), 20)  # suma 400
+    datagen.DataGenerator._fit_delivery_counts(per_trip, target)
+    assert per_trip.sum() == target
+    assert per_trip.min() >= 2 and per_trip.max() <= 6
+
+
+@pytest.mark.parametrize("target", [199, 601])
+def test_fit_delivery_counts_rejects_unreachable_target(datagen, target):
+    per_trip = np.full(100, 4, dtype=np.int32)
+    with pytest.raises(RuntimeError):
+        datagen.DataGenerator._fit_delivery_counts(per_trip, target)
+
+
+def test_plan_shards_covers_trips_and_deliveries(datagen):
+    plan = datagen.DataGenerator._plan_shards(10, 37, 4)
+    assert [s["n_trips"] for s in plan] == [4, 4, 2]
+    assert sum(s["target"] for s in plan) == 37
+    # rangos de ids contiguos y sin solapes
+    assert [s["trip_offset"] for s in plan] == [0, 4, 8]
+    offsets = [s["delivery_offset"] for s in plan]
+    assert offsets == [0, plan[0]["target"], plan[0]["target"] + plan[1]["target"]]
+    # target proporcional al tamaño del shard (el resto va a los primeros)
+    assert all(abs(s["target"] - 37 * s["n_trips"] / 10) < 1 for s in plan)
+
+
+def test_shard_seed_is_deterministic(datagen):
+    seed = datagen.DataGenerator.shard_seed
+    assert seed(42, 3) == seed(42, 3)
+    assert len({seed(42, shard) for shard in range(100)}) == 100
+    assert seed(42, 0) != seed(7, 0)
+
+
+def test_gen_plates_are_unique(datagen):
+    plates = datagen.DataGenerator._gen_plates(20_000)
+    assert len(set(plates)) == 20_000
+    assert all(re.fullmatch(r"[A-Z]{3}\d{3}", p) for p in plates)
+
+
+def _catalogs(datagen, out_dir):
+    gen = datagen.DataGenerator(
+        {}, output="csv", output_dir=str(out_dir), seed=7, identity_pool_size=500
+    )
+    gen.connect()
+    gen.generate_vehicles(20)
+    gen.generate_drivers(30)
+    gen.generate_routes(10)
+    return gen, gen._load_trip_catalogs()
+
+
+def test_copy_loader_honours_commit_every(datagen, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(datagen, "COPY_CHUNK_ROWS", 2500)
+    gen = datagen.DataGenerator({}, loader="copy", identity_pool_size=500)
+    commits = []
+    gen.conn = SimpleNamespace(commit=lambda: commits.append(True))
+    sizes = {}
+    monkeypatch.setattr(
+        gen,
+        "_copy_chunk",
+        lambda table, columns, rows: sizes.setdefault(table, []).append(len(rows))
+        or 0,
+    )
+    # granularidad explícita de la llamada
+    assert gen._load("t", ("x",), [(i,) for i in range(7)], commit_every=3) == 7
+    assert sizes.pop("t") == [3, 3, 1]
+    assert len(commits) == 3
+    commits.clear()
+
+    # trips/deliveries no fijan granularidad en copy: rige COPY_CHUNK_ROWS
+    _, catalogs = _catalogs(datagen, tmp_path)
+    now = datetime(2025, 3, 1)
+    gen.generate_shard(0, 0, 3000, 0, 6000, 3000, catalogs, now, now, 2025)
+    assert sizes == {"trips": [2500, 500], "deliveries": [2500, 2500, 1000]}
+    assert len(commits) == 5
+
+
+def test_trip_columns_follow_a_given_departure(datagen, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gen, (vehicles, drivers, routes) = _catalogs(datagen, tmp_path)
+    t0 = datetime(2025, 3, 1, 8)
+    departure = np.datetime64(t0, "us") + np.arange(50).astype("timedelta64[m]")
+    cols = gen._build_trip_columns(
+        np.random.default_rng(7), 50, vehicles, drivers, routes, t0, t0,
+        departure=departure,
+    )
+    assert (cols["departure_datetime"] == departure).all()
+    assert (cols["arrival_datetime"] > departure).all()
+    assert not cols["completed"].any()
+
+
+def _generate(datagen, out_dir, workers):
+    gen = datagen.DataGenerator(
+        {}, output="csv", output_dir=str(out_dir), seed=7, identity_pool_size=500
+    )
+    gen.connect()
+    gen.generate_vehicles(20)
+    gen.generate_drivers(30)
+    gen.generate_routes(10)
+    gen.generate_trips_and_deliveries_parallel(2_000, 6_000, workers, 700)
+    gen.generate_maintenance(50)
+    return {
+        str(p.relative_to(out_dir)): gzip.decompress(p.read_bytes())
+        for p in sorted(out_dir.rglob("*.csv.gz"))
+    }
+
+
+def test_output_does_not_depend_on_workers(datagen, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cache del pool de identidades
+    files = {}
+    for workers in (0, 2):
+        # maestras y maintenance usan random/Faker, como en main(); trips y
+        # deliveries solo el generador de cada shard
+        datagen.random.seed(7)
+        datagen.Faker.seed(7)
+        datagen.np.random.seed(workers)  # el estado global de NumPy no influye
+        files[workers] = _generate(datagen, tmp_path / f"w{workers}", workers)
+    assert any(name.startswith("deliveries/") for name in files[0])
+    assert files[0] == files[2]
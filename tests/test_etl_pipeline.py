@@ -0,0 +1,561 @@
+import json
+import os
+import re
+import threading
+from datetime import date
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+
+# --------------------------------------------------------------------------------------
+# Calendario
+# --------------------------------------------------------------------------------------
+def test_easter_sundays(etl_module):
+    years = np.array([2024, 2025, 2026, 2038])
+    expected = np.array(
+        ["2024-03-31", "2025-04-20", "2026-04-05", "2038-04-25"], dtype="datetime64[D]"
+    )
+    assert (etl_module.easter_sundays(years) == expected).all()
+
+
+def test_colombian_holidays(etl_module):
+    assert len(etl_module.colombian_holidays(np.array([2024]))) == 18
+    holidays = etl_module.colombian_holidays(np.array([2025]))
+    # San Pedro (29/6, domingo -> 30/6) coincide con el Sagrado Corazón
+    assert len(holidays) == 17
+    assert holidays[np.datetime64("2025-06-30")] == "San Pedro y San Pablo"
+    dates = pd.DatetimeIndex(holidays.index)
+    # trasladados al lunes por Ley Emiliani, salvo los que ya caen en lunes
+    assert (dates[holidays.isin(["San José", "Reyes Magos"])].weekday == 0).all()
+    assert holidays[np.datetime64("2025-03-24")] == "San José"
+    assert holidays[np.datetime64("2025-01-06")] == "Reyes Magos"
+    assert holidays[np.datetime64("2025-04-18")] == "Viernes Santo"
+    assert holidays[np.datetime64("2025-12-25")] == "Navidad"
+
+
+def test_date_and_time_keys(etl_module):
+    stamps = np.array(
+        ["2024-02-29T00:00", "2025-12-31T23:59", "NaT"], dtype="datetime64[m]"
+    )
+    assert etl_module.date_keys(stamps).tolist() == [20240229, 20251231, -1]
+    assert etl_module.time_keys(stamps).tolist() == [0, 2359, -1]
+
+
+def test_build_dim_date_matches_keys(etl_module):
+    dim = etl_module.build_dim_date("2024-12-30", "2025-01-06")
+    assert dim["date_key"].tolist()[:3] == [20241230, 20241231, 20250101]
+    assert dim.loc[dim["date_key"] == 20250101, "is_holiday"].item()
+    assert dim.loc[dim["date_key"] == 20250104, "is_weekend"].item()
+
+
+# --------------------------------------------------------------------------------------
+# Cache de surrogate keys
+# --------------------------------------------------------------------------------------
+@pytest.fixture
+def key_cache_db():
+    db = duckdb.connect()
+    db.execute(
+        """
+        CREATE TABLE dim_vehicle AS SELECT * FROM (VALUES
+            (10, 1, DATE '2024-01-01', DATE '2024-06-30', false),
+            (11, 1, DATE '2024-07-01', NULL, true),
+            (20, 2, DATE '2024-03-01', DATE '2024-05-31', false)
+        ) t(vehicle_key, vehicle_id, valid_from, valid_to, is_current)
+        """
+    )
+    db.execute(
+        "CREATE TABLE dim_driver AS SELECT 1 AS driver_key, 1 AS driver_id, "
+        "DATE '2020-01-01' AS valid_from, NULL::DATE AS valid_to"
+    )
+    db.execute("CREATE TABLE dim_route AS SELECT 5 AS route_key, 7 AS route_id")
+    db.execute(
+        "CREATE TABLE dim_customer AS SELECT 3 AS customer_key, "
+        "'Ana' AS customer_name, 'Cali' AS city"
+    )
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def key_cache(etl_module, key_cache_db):
+    cache = etl_module.DimensionKeyCache()
+    cache.load(key_cache_db)
+    return cache
+
+
+def test_key_cache_resolves_scd2_versions(key_cache):
+    days = key_cache._days(
+        ["2024-03-15", "2024-08-01", "2023-05-01", "2024-06-15", "2024-03-15"]
+    )
+    ids = np.array([1, 1, 1, 2, 3])
+    # vigente, versión nueva, anterior a la primera, vencida, inexistente
+    assert key_cache.resolve("dim_vehicle", ids, days).tolist() == [10, 11, 10, -1, -1]
+
+
+def test_key_cache_resolves_non_scd_and_customers(key_cache):
+    days = key_cache._days(["2024-01-01", "2024-01-01"])
+    assert key_cache.resolve("dim_route", np.array([7, 8]), days).tolist() == [5, -1]
+    keys = key_cache.resolve_customers(
+        pd.Series(["Ana", "Ana"]), pd.Series(["Cali", "Bogotá"])
+    )
+    assert keys.tolist() == [3, -1]
+
+
+def test_key_cache_refresh_moves_its_window(etl_module, key_cache, key_cache_db):
+    today = key_cache.refreshed_at["dim_vehicle"]
+    key_cache.refreshed_at["dim_vehicle"] = date(2024, 1, 1)
+    key_cache.refresh(etl_module._DuckDBCursor(key_cache_db), "dim_vehicle")
+    # el refresco avanza la ventana: el próximo no vuelve a traer todas las
+    # versiones vencidas desde la carga
+    assert key_cache.refreshed_at["dim_vehicle"] == today
+    days = key_cache._days(["2024-03-15", "2024-08-01"])
+    ids = np.array([1, 1])
+    assert key_cache.resolve("dim_vehicle", ids, days).tolist() == [10, 11]
+
+
+# --------------------------------------------------------------------------------------
+# Pipeline por etapas
+# --------------------------------------------------------------------------------------
+def test_stage_pipeline_keeps_order(etl_module):
+    out = []
+    pipeline = etl_module.StagePipeline(
+        range(50), [("double", lambda x: x * 2), ("collect", out.append)], queue_size=2
+    )
+    timings = pipeline.run()
+    assert out == [x * 2 for x in range(50)]
+    assert timings["extract"]["items"] == timings["collect"]["items"] == 50
+
+
+def test_stage_pipeline_stops_and_reraises(etl_module):
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield from range(1000)
+        finally:
+            closed.set()
+
+    def fail(x):
+        if x == 5:
+            raise ValueError("bloque inválido")
+        return x
+
+    pipeline = etl_module.StagePipeline(source(), [("fail", fail), ("sink", str)])
+    with pytest.raises(ValueError, match="bloque inválido"):
+        pipeline.run()
+    assert closed.is_set()  # la fuente se cierra aunque no se haya agotado
+
+
+# --------------------------------------------------------------------------------------
+# Dialecto y esquema DuckDB
+# --------------------------------------------------------------------------------------
+def test_to_duckdb_translates_snowflake_sql(etl_module):
+    sql = etl_module.to_duckdb(
+        "CREATE OR REPLACE TEMPORARY TABLE stg LIKE dim_route; "
+        "SELECT IFF(a, 1, 0), CURRENT_TIMESTAMP(), DATEADD(day, -7, CURRENT_DATE()) "
+        "FROM t WHERE ts::TIMESTAMP_NTZ > %s"
+    )
+    assert sql == (
+        "CREATE OR REPLACE TEMP TABLE stg AS SELECT * FROM dim_route LIMIT 0; "
+        "SELECT if(a, 1, 0), current_timestamp, (current_date + (-7)) "
+        "FROM t WHERE ts::TIMESTAMP > ?"
+    )
+
+
+def test_duckdb_schema_is_idempotent(etl_module):
+    statements = etl_module.duckdb_schema()
+    db = duckdb.connect()
+    for _ in range(2):  # IF NOT EXISTS: repetir no falla ni borra datos
+        for stmt in statements:
+            db.execute(stmt)
+        db.execute("INSERT INTO dim_customer (customer_key) VALUES (1)")
+    tables = {
+        r[0]
+        for r in db.execute(
+            "SELECT table_name FROM information_schema.tables"
+        ).fetchall()
+    }
+    assert {
+        "dim_date",
+        "dim_customer",
+        "fact_deliveries",
+        "v_sales_deliveries",
+    } <= tables
+    # IDENTITY -> secuencia: cada fila recibe su propio customer_id
+    ids = db.execute("SELECT COUNT(*), COUNT(DISTINCT customer_id) FROM dim_customer")
+    assert ids.fetchone() == (2, 2)
+
+
+def test_duckdb_warehouse_rolls_back(etl_module, dw_path):
+    dw = etl_module.DuckDBWarehouse(dw_path)
+    cursor = dw.cursor()
+    cursor.execute("INSERT INTO dim_route (route_key, route_id) VALUES (1, 1)")
+    dw.commit()
+    cursor.execute("INSERT INTO dim_route (route_key, route_id) VALUES (2, 2)")
+    dw.rollback()
+    cursor.execute("SELECT route_key FROM dim_route")
+    assert cursor.fetchall() == [(1,)]
+    dw.close()
+
+
+def test_local_warehouse_deletes_only_in_overlapping_files(
+    etl_module, tmp_path, monkeypatch
+):
+    wh = etl_module.LocalFileWarehouse(str(tmp_path / "wh"))
+    for part in range(3):  # delivery_id 1-100, 101-200, 201-300
+        path = tmp_path / "stage" / f"p{part}" / "part-0.parquet"
+        path.parent.mkdir(parents=True)
+        ids = np.arange(part * 100 + 1, part * 100 + 101)
+        table = etl_module.pa.table(
+            {"delivery_id": ids, "etl_batch_id": np.ones_like(ids)}
+        )
+        etl_module.pq.write_table(table, path)
+        wh.copy_into("fact_deliveries", [str(path)], part)
+    read = []
+    read_table = etl_module.pq.read_table
+
+    def counting(path, **kwargs):
+        read.append(os.path.basename(path))
+        return read_table(path, **kwargs)
+
+    monkeypatch.setattr(etl_module.pq, "read_table", counting)
+    assert wh.delete_where_in("fact_deliveries", "delivery_id", [150, 160, 999]) == 2
+    assert read == ["batch-1-p1-part-0.parquet"] * 2  # ids y reescritura
+    read.clear()
+    deleted = wh.delete_batch_range("fact_deliveries", 1, "delivery_id", 250, 400)
+    assert deleted == 51
+    assert read == ["batch-2-p2-part-0.parquet"] * 2
+    remaining = read_table(os.path.join(wh.root, "fact_deliveries"))
+    assert remaining.num_rows == 300 - 2 - 51
+
+
+# --------------------------------------------------------------------------------------
+# Métricas
+# --------------------------------------------------------------------------------------
+def test_prometheus_text(etl_module):
+    perf = etl_module.RunMetrics()
+    with perf.stage("extract"):
+        perf.add(rows_in=10, rows_out=10, bytes_moved=4096)
+        with perf.query('SELECT "deliveries"'):
+            pass
+    stages = perf.snapshot()
+    stages["extract"]["peak_rss_mb"] = None  # sin dato: no se exporta
+    record = {
+        "warehouse": "duckdb",
+        "timestamp": 1700000000.5,
+        "duration_seconds": 2.0,
+        "ok": True,
+        "counters": {"records_extracted": 10, "errors": 0},
+        "stages": stages,
+    }
+    text = etl_module.prometheus_text(record)
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert 'fleetlogix_etl_run_success{warehouse="duckdb"} 1' in lines
+    assert (
+        'fleetlogix_etl_stage_rows_in{warehouse="duckdb",stage="extract"} 10' in lines
+    )
+    assert 'statement="SELECT \\"deliveries\\""' in text
+    assert lines.count("# TYPE fleetlogix_etl_records gauge") == 1
+    assert "stage_peak_rss_bytes" not in text
+    # cada muestra: nombre{etiquetas} valor
+    samples = [line for line in lines if not line.startswith("#")]
+    assert all(re.fullmatch(r"fleetlogix_etl_\w+\{.*\} \S+", s) for s in samples)
+
+
+# --------------------------------------------------------------------------------------
+# Corrida completa sobre DuckDB
+# --------------------------------------------------------------------------------------
+def _warehouse(dw_path: str, sql: str):
+    db = duckdb.connect(dw_path, read_only=True)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize(
+    "workers, pipeline", [(1, False), (1, True), (3, True)], ids=str
+)
+def test_run_etl_on_duckdb(etl, dw_path, workers, pipeline):
+    job = etl.FleetLogixETL(
+        full_refresh=True,
+        warehouse="duckdb",
+        chunk_size=250,
+        extract_workers=workers,
+        pipeline=pipeline,
+    )
+    job.run_etl()
+
+    assert job.metrics["errors"] == 0
+    assert job.metrics["records_loaded"] == 1200
+    facts = _warehouse(
+        dw_path,
+        "SELECT COUNT(*), COUNT(DISTINCT delivery_id), MIN(vehicle_key), "
+        "MIN(driver_key), MIN(route_key), MIN(customer_key), "
+        "MIN(cost_per_delivery), MAX(cost_per_delivery) FROM fact_deliveries",
+    )[0]
+    # 4 entregas por trip: (80 L * 5.000 + 20.000 peaje) / 4
+    assert facts == (1200, 1200, 1, 1, 1, 1, 105000, 105000)
+    assert (
+        _warehouse(dw_path, "SELECT SUM(total_deliveries) FROM fact_daily_metrics")[0][
+            0
+        ]
+        == 1200
+    )
+
+    with open(job.watermark_path, encoding="utf-8") as f:
+        assert json.load(f)["delivery_id"] == 1200
+    with open(etl.METRICS_HISTORY_PATH, encoding="utf-8") as f:
+        record = json.loads(f.readlines()[-1])
+    assert record["ok"] and record["stages"]["extract"]["rows_in"] == 1200
+
+
+def test_facts_need_the_key_cache(etl, dw_path, monkeypatch):
+    def broken(self, cursor):
+        raise RuntimeError("dimensiones ilegibles")
+
+    monkeypatch.setattr(etl.DimensionKeyCache, "load", broken)
+    job = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    job.run_etl()
+    # sin cache no se cargan hechos con natural ids en lugar de surrogate keys
+    assert job.metrics["errors"] > 0
+    assert job.metrics["records_loaded"] == 0
+    assert _warehouse(dw_path, "SELECT COUNT(*) FROM fact_deliveries") == [(0,)]
+    with pytest.raises(RuntimeError, match="Cache de keys"):
+        job._resolve_keys(pd.DataFrame({"vehicle_id": [1]}))
+
+def test_scd2_change_on_the_same_day_is_corrected_in_place(etl, dw_path, source_db):
+    job = etl.FleetLogixETL(warehouse="duckdb")
+    assert job.connect_databases()
+    loader = etl.DIMENSIONS["dim_vehicle"]
+    cursor = job._dw_cursor()
+    source = source_db.execute(etl.DIMENSION_SOURCES["dim_vehicle"]).df()
+    loader.load(job, cursor, source)  # versiones abiertas hoy
+    cursor.execute(
+        "UPDATE dim_vehicle SET valid_from = DATE '2024-01-01' WHERE vehicle_id = 2"
+    )
+    for plate in ("ZZZ001", "ZZZ002"):  # dos cambios en el mismo día
+        changed = source.assign(license_plate=plate, row_hash=plate)
+        loader.load(job, cursor, changed)
+    job.dw.commit()
+    job.dw.close()
+
+    versions = _warehouse(
+        dw_path,
+        "SELECT vehicle_id, license_plate, is_current, valid_to < valid_from "
+        "FROM dim_vehicle ORDER BY vehicle_id, vehicle_key",
+    )
+    assert versions == [
+        (1, "ZZZ002", True, False),
+        (2, "ABC101", False, False),  # versión de un día anterior: se vence
+        (2, "ZZZ002", True, False),
+        (3, "ZZZ002", True, False),
+    ]
+
+
+def test_incremental_run_counts_whole_trip(etl, dw_path, source_db):
+    first = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    first.run_etl()
+    # dos entregas tardías del último trip: el delta solo trae esas dos
+    source_db.execute(
+        """
+        INSERT INTO deliveries
+        SELECT 1200 + range + 1, 300, 'FL-late' || range, 'Cliente 1', 2.5,
+               'delivered', TIMESTAMP '2024-01-06 08:00', TIMESTAMP '2024-01-06 09:00',
+               true
+        FROM range(2)
+        """
+    )
+    # sin checkpoints: DuckDB no admite el rango de tuplas (delta + cota superior)
+    job = etl.FleetLogixETL(
+        warehouse="duckdb", chunk_size=250, lookback_hours=0, checkpoints=False
+    )
+    job.batch_id = first.batch_id + 1  # batch_id es el epoch en segundos
+    job.run_etl()
+
+    assert job.metrics["errors"] == 0
+    assert job.metrics["records_loaded"] == 2
+    costs = _warehouse(
+        dw_path,
+        "SELECT DISTINCT cost_per_delivery FROM fact_deliveries "
+        f"WHERE etl_batch_id = {job.batch_id}",
+    )
+    assert costs == [(70000,)]  # (80 * 5.000 + 20.000) / 6 entregas del trip
+
+
+def test_incremental_rerun_after_failure_does_not_duplicate(
+    etl, dw_path, source_db, monkeypatch
+):
+    first = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    first.run_etl()
+    # 100 trips nuevos (400 entregas) por encima del watermark
+    source_db.execute(
+        """
+        INSERT INTO trips
+        SELECT 301 + range, range % 3 + 1, range % 4 + 1, range % 5 + 1,
+               TIMESTAMP '2024-01-10 06:00' + INTERVAL (range * 20) MINUTE,
+               TIMESTAMP '2024-01-10 12:00' + INTERVAL (range * 20) MINUTE, 80.0
+        FROM range(100)
+        """
+    )
+    source_db.execute(
+        """
+        INSERT INTO deliveries
+        SELECT 1201 + range, 301 + range // 4, 'FL-new' || range, 'Cliente 1', 2.5,
+               'delivered', TIMESTAMP '2024-01-10 07:00' + INTERVAL (range * 6) MINUTE,
+               TIMESTAMP '2024-01-10 07:30' + INTERVAL (range * 6) MINUTE, true
+        FROM range(400)
+        """
+    )
+    transform = etl.FleetLogixETL.transform_data
+    calls = []
+
+    def flaky(self, df):
+        calls.append(len(df))
+        if len(calls) == 2:
+            df = df.drop(columns=["scheduled_datetime"])
+        return transform(self, df)
+
+    # sin checkpoints: los bloques cargados quedan sobre un watermark que no avanza
+    options = dict(
+        warehouse="duckdb",
+        chunk_size=100,
+        extract_workers=1,
+        lookback_hours=0,
+        checkpoints=False,
+    )
+    monkeypatch.setattr(etl.FleetLogixETL, "transform_data", flaky)
+    failed = etl.FleetLogixETL(**options)
+    failed.batch_id = first.batch_id + 1
+    failed.run_etl()
+    assert failed.metrics["errors"] == 1
+    assert 1200 < _warehouse(dw_path, "SELECT COUNT(*) FROM fact_deliveries")[0][0]
+
+    monkeypatch.setattr(etl.FleetLogixETL, "transform_data", transform)
+    rerun = etl.FleetLogixETL(**options)
+    rerun.batch_id = first.batch_id + 2
+    rerun.run_etl()
+    assert rerun.metrics["errors"] == 0
+    assert rerun.metrics["records_loaded"] == 400
+    assert _warehouse(
+        dw_path,
+        "SELECT COUNT(*), COUNT(DISTINCT delivery_id) FROM fact_deliveries",
+    ) == [(1600, 1600)]
+    assert (
+        _warehouse(dw_path, "SELECT SUM(total_deliveries) FROM fact_daily_metrics")[0][
+            0
+        ]
+        == 1600
+    )
+
+
+def test_failed_chunk_is_resumed_and_aggregated(etl, dw_path, monkeypatch):
+    transform = etl.FleetLogixETL.transform_data
+    calls = []
+
+    def flaky(self, df):
+        calls.append(len(df))
+        if len(calls) == 2:
+            df = df.drop(columns=["scheduled_datetime"])
+        return transform(self, df)
+
+    monkeypatch.setattr(etl.FleetLogixETL, "transform_data", flaky)
+    first = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    first.run_etl()
+    assert first.metrics["errors"] == 1
+    assert not os.path.exists(first.watermark_path)
+    loaded = _warehouse(dw_path, "SELECT COUNT(*) FROM fact_deliveries")[0][0]
+    assert 0 < loaded < 1200
+    assert _warehouse(dw_path, "SELECT COUNT(*) FROM etl_aggregate_batches") == [(0,)]
+
+    monkeypatch.setattr(etl.FleetLogixETL, "transform_data", transform)
+    resumed = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    resumed.run_etl()
+    assert resumed.metrics["errors"] == 0
+    assert resumed.batch_id == first.batch_id
+    assert _warehouse(
+        dw_path,
+        "SELECT COUNT(*), COUNT(DISTINCT delivery_id) FROM fact_deliveries",
+    ) == [(1200, 1200)]
+    assert (
+        _warehouse(dw_path, "SELECT SUM(total_deliveries) FROM fact_daily_metrics")[0][
+            0
+        ]
+        == 1200
+    )
+
+
+def test_failed_fact_load_does_not_recount_customers(etl, dw_path, monkeypatch):
+    copy_into = etl.FleetLogixETL._copy_into
+    calls = []
+
+    def flaky(self, cursor, table, *args, **kwargs):
+        if table == "fact_deliveries":
+            calls.append(table)
+            if len(calls) == 2:  # el bloque 2, con sus clientes ya sumados
+                raise RuntimeError("COPY INTO falló")
+        return copy_into(self, cursor, table, *args, **kwargs)
+
+    monkeypatch.setattr(etl.FleetLogixETL, "_copy_into", flaky)
+    # extracción secuencial: al reanudar, los bloques se cortan de nuevo
+    options = dict(warehouse="duckdb", chunk_size=250, extract_workers=1)
+    first = etl.FleetLogixETL(full_refresh=True, **options)
+    first.run_etl()
+    assert first.metrics["errors"] == 1
+    assert len(calls) > 2  # los bloques siguientes sí se cargaron
+
+    monkeypatch.setattr(etl.FleetLogixETL, "_copy_into", copy_into)
+    resumed = etl.FleetLogixETL(full_refresh=True, **options)
+    resumed.run_etl()
+    assert resumed.metrics["errors"] == 0
+    assert _warehouse(
+        dw_path,
+        "SELECT COUNT(*), COUNT(DISTINCT delivery_id) FROM fact_deliveries",
+    ) == [(1200, 1200)]
+    assert _warehouse(
+        dw_path, "SELECT SUM(total_deliveries) FROM dim_customer"
+    ) == [(1200,)]
+
+
+def test_full_refresh_does_not_accumulate_customers(etl, dw_path):
+    for _ in range(2):
+        job = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+        job.run_etl()
+        assert job.metrics["errors"] == 0
+    assert _warehouse(
+        dw_path,
+        "SELECT (SELECT SUM(total_deliveries) FROM dim_customer), "
+        "(SELECT COUNT(*) FROM fact_deliveries)",
+    ) == [(1200, 1200)]
+
+
+def test_failed_aggregate_merge_is_rolled_back(etl, dw_path, monkeypatch):
+    execute = etl._TimedCursor.execute
+
+    def failing(self, sql, params=None):
+        if "INSERT INTO etl_aggregate_batches" in sql:
+            raise RuntimeError("caída antes de registrar el batch")
+        return execute(self, sql, params)
+
+    monkeypatch.setattr(etl._TimedCursor, "execute", failing)
+    first = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    first.run_etl()
+    assert first.metrics["errors"] == 1
+    # los MERGE de agregados ya corrieron: el rollback los deshace
+    assert _warehouse(dw_path, "SELECT COUNT(*) FROM fact_daily_metrics") == [(0,)]
+    assert _warehouse(dw_path, "SELECT COUNT(*) FROM etl_aggregate_batches") == [(0,)]
+
+    monkeypatch.setattr(etl._TimedCursor, "execute", execute)
+    resumed = etl.FleetLogixETL(full_refresh=True, warehouse="duckdb", chunk_size=250)
+    resumed.run_etl()
+    assert resumed.metrics["errors"] == 0
+    assert (
+        _warehouse(dw_path, "SELECT SUM(total_deliveries) FROM fact_daily_metrics")[0][
+            0
+        ]
+        == 1200
+    )